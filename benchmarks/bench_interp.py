@@ -0,0 +1,72 @@
+"""
+Benchmark of the NaN-gap interpolation behind Instrument.interp.
+
+Compares the previous implementation (a Python loop over find_consecutive_runs with one np.interp call per
+gap) with the vectorized pyscourtools.gaps.fill_gaps on a synthetic despiked record.
+
+Usage:
+    python benchmarks/bench_interp.py [samples] [gap fraction]
+"""
+import sys
+import time
+import numpy as np
+from pyscourtools.gaps import fill_gaps
+
+
+def find_consecutive_runs(data):
+    runs = []
+    start_idx = None
+    for idx in data:
+        if start_idx is None:
+            start_idx = idx
+        elif idx != prev_idx + 1:
+            runs.append((start_idx, prev_idx))
+            start_idx = idx
+        prev_idx = idx
+    if start_idx is not None:
+        runs.append((start_idx, prev_idx))
+    return runs
+
+
+def loop_interp(data, limit):
+    data = data.copy()
+    valid_indices = np.where(~np.isnan(data))[0]
+    invalid_indices = np.where(np.isnan(data))[0]
+    valid_data = data[valid_indices]
+    for run in find_consecutive_runs(invalid_indices):
+        run_length = run[1] - run[0] + 1
+        if run_length <= limit:
+            interp_indices = np.arange(run[0], run[1] + 1)
+            data[interp_indices] = np.interp(interp_indices, valid_indices, valid_data)
+    return data
+
+
+def make_gappy_data(samples, gap_fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(samples) / 100
+    data = np.sin(t) + 0.1 * rng.standard_normal(samples)
+    starts = rng.integers(0, samples, int(samples * gap_fraction / 3))
+    lengths = rng.geometric(0.3, len(starts))
+    for start, length in zip(starts, lengths):
+        data[start:start + length] = np.nan
+    return data
+
+
+def main(samples=500000, gap_fraction=0.2, limit=50):
+    data = make_gappy_data(samples, gap_fraction)
+    print(f"{samples} samples, {np.isnan(data).sum()} NaNs")
+    start = time.perf_counter()
+    reference = loop_interp(data, limit)
+    loop_time = time.perf_counter() - start
+    print(f"{'loop (previous)':<20} {loop_time:8.3f} s")
+    for method in ["linear", "nearest", "cubic"]:
+        start = time.perf_counter()
+        result = fill_gaps(data, limit=limit, method=method)
+        seconds = time.perf_counter() - start
+        print(f"{'fill_gaps ' + method:<20} {seconds:8.3f} s  x{loop_time / seconds:7.1f}")
+        if method == "linear":
+            assert np.allclose(result, reference, equal_nan=True)
+
+
+if __name__ == "__main__":
+    main(*[float(arg) if "." in arg else int(arg) for arg in sys.argv[1:]])
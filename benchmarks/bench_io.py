@@ -0,0 +1,53 @@
+"""
+Benchmark of the logger file loads in pyscourtools.io.
+
+Compares a text parse (the pandas whitespace engine), a load from the binary cache,
+a memory-mapped load and a windowed load of one channel from the cache.
+
+Usage:
+    python benchmarks/bench_io.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from pyscourtools.io import IO
+
+
+def make_logger_file(fname, rows, fs=1000):
+    t = np.arange(rows) / fs
+    columns = [t] + [np.sin(2 * np.pi * (i + 1) * t) * 100 + 500 for i in range(8)]
+    np.savetxt(fname, np.column_stack(columns), fmt="%.6f", delimiter="\t", header="Logger data", comments="")
+
+
+def timeit(func, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(rows=1000000):
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, "Logger.txt")
+        make_logger_file(fname, rows)
+        print(f"{rows} rows, {os.path.getsize(fname) / 1e6:.1f} MB")
+        io = IO(fname, use_cache=False, load=False)
+        results = {
+            "IO, text parse": timeit(io._read_text),
+            "IO, no cache": timeit(lambda: IO(fname, use_cache=False)),
+        }
+        IO(fname)
+        results["IO, binary cache"] = timeit(lambda: IO(fname))
+        results["IO, memory-mapped cache"] = timeit(lambda: IO(fname, mmap=True))
+        results["IO, cache, US1 for 60 s"] = timeit(lambda: IO(fname, columns=["US1"], duration=60))
+        reference = results["IO, text parse"]
+        for name, seconds in results.items():
+            print(f"{name:<30} {seconds:8.3f} s  x{reference / seconds:6.1f}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
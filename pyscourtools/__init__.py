@@ -1,8 +1,13 @@
 from .experiment import Experiment
 from .io import IO
 from .instrument import Instrument
+from .block import SignalBlock
+from .filters import ButterworthFilter
+from .store import ProcessedStore
 from .video import Video
 from .animation import VideoOnScreen, VideoAsAnimation
 from .compare import Compare
+from .campaign import Campaign
+from .summary import summarize
 from .plotter import Plotter, Specifications
 from .scour import ScourScatter, ScourScatterCheck
@@ -0,0 +1,142 @@
+"""
+Resampling of instruments with different clocks (e.g. ADV and US sensors, or several tests) onto one time grid.
+
+Channels are grouped by clock; for every group the interpolation indices and weights on the target grid are
+computed once and applied to all of its channels in one array operation.
+"""
+import numpy as np
+from .timebase import UniformTime, same_axis
+from .filters import ButterworthFilter
+from .gaps import fill_gaps
+from .block import SignalBlock
+
+
+def common_grid(times, fs=None, start=None, end=None):
+    """
+    Uniform time grid covering the span shared by all time axes.
+
+    Parameters:
+    times (list): Time axes (arrays or UniformTime).
+    fs (float): Sampling frequency of the grid. Defaults to the lowest sampling frequency of the axes.
+    start (float): Start of the grid. Defaults to the latest first sample.
+    end (float): End of the grid (inclusive). Defaults to the earliest last sample.
+
+    Returns:
+    UniformTime: The grid.
+    """
+    if fs is None:
+        fs = min((len(time) - 1) / (time[-1] - time[0]) for time in times)
+    start = max(time[0] for time in times) if start is None else start
+    end = min(time[-1] for time in times) if end is None else end
+    n = int(np.floor((end - start) * fs + 1e-9)) + 1
+    return UniformTime(start, 1 / fs, max(n, 0))
+
+
+def _positions(time, grid):
+    # Fractional sample index of every grid point on the source axis
+    grid = np.asarray(grid, dtype=float)
+    if isinstance(time, UniformTime):
+        return (grid - time.t0) / time.dt
+    time = np.asarray(time, dtype=float)
+    right = np.clip(np.searchsorted(time, grid, side="right"), 1, len(time) - 1)
+    left = right - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return left + (grid - time[left]) / (time[right] - time[left])
+
+
+def resample(time, data, grid, method="linear"):
+    """
+    Resample channels sharing one time axis onto a grid.
+
+    Parameters:
+    time (np.array or UniformTime): Source time axis.
+    data (np.array): 1D record or 2D (n_samples, n_channels) block.
+    grid (np.array or UniformTime): Target time axis.
+    method (str): "linear", "nearest" or "decimate" (zero-phase anti-alias low-pass at 80 % of the grid's
+        Nyquist frequency, then linear interpolation; for grids coarser than the source).
+
+    Returns:
+    np.array: Data on the grid, NaN outside the source span and where the source sample is NaN.
+    """
+    if method not in ("linear", "nearest", "decimate"):
+        raise ValueError(f"Invalid resampling method '{method}'. Choose 'linear', 'nearest' or 'decimate'.")
+    data = np.asarray(data, dtype=float)
+    n = len(time)
+    if n == 0 or len(grid) == 0:
+        return np.full((len(grid),) + data.shape[1:], np.nan)
+    if same_axis(time, grid):
+        return data.copy()
+    position = _positions(time, grid)
+    outside = ~((position >= -1e-9) & (position <= n - 1 + 1e-9))
+    position = np.clip(np.nan_to_num(position), 0, n - 1)
+    invalid = np.isnan(data)
+    if method == "nearest":
+        result = data[np.rint(position).astype(int)]
+    else:
+        source = data
+        if method == "decimate":
+            grid_fs = (len(grid) - 1) / (grid[-1] - grid[0]) if len(grid) > 1 else np.inf
+            source_fs = (n - 1) / (time[-1] - time[0])
+            if grid_fs < source_fs:
+                # The filter cannot run through gaps: fill them for filtering only
+                butterworth = ButterworthFilter(4, 0.4 * grid_fs, source_fs)
+                source = butterworth.filtfilt(fill_gaps(data) if invalid.any() else data, axis=0)
+        left = np.minimum(np.floor(position).astype(int), n - 2) if n > 1 else np.zeros(len(position), dtype=int)
+        weight = position - left
+        right = np.minimum(left + 1, n - 1)
+        if data.ndim == 2:
+            weight = weight[:, None]
+        result = source[left] * (1 - weight) + source[right] * weight
+        # A gap in the source stays a gap on the grid
+        if invalid.any():
+            result[invalid[np.rint(position).astype(int)]] = np.nan
+    result[outside] = np.nan
+    return result
+
+
+def group_by_clock(instruments):
+    """
+    Group instruments that share a time axis.
+
+    Returns:
+    list: Lists of indices into instruments, one per distinct time axis.
+    """
+    groups = []
+    for j, inst in enumerate(instruments):
+        for group in groups:
+            time = instruments[group[0]].time
+            if same_axis(time, inst.time) or (len(time) == len(inst.time) and np.array_equal(time, inst.time)):
+                group.append(j)
+                break
+        else:
+            groups.append([j])
+    return groups
+
+
+def align(instruments, grid=None, fs=None, start=None, end=None, method="linear", names=None):
+    """
+    Resample instruments, from one or several experiments, onto a common grid.
+
+    Parameters:
+    instruments (list): Instruments to align.
+    grid (np.array or UniformTime): Target grid. Defaults to common_grid of the instruments (fs, start, end).
+    method (str): "linear", "nearest" or "decimate" (see resample).
+    names (list): Channel names. Defaults to the instrument names, prefixed with the test name when
+        instruments of different tests share a name.
+
+    Returns:
+    SignalBlock: The aligned (n_samples, n_channels) block.
+    """
+    instruments = list(instruments)
+    if grid is None:
+        grid = common_grid([inst.time for inst in instruments], fs=fs, start=start, end=end)
+    if names is None:
+        names = [inst.name for inst in instruments]
+        if len(set(names)) < len(names):
+            names = [f"{inst.test_name}/{inst.name}" for inst in instruments]
+    data = np.empty((len(grid), len(instruments)), order="F")
+    # Instruments on the same clock are resampled together
+    for group in group_by_clock(instruments):
+        block = np.column_stack([instruments[j].data for j in group])
+        data[:, group] = resample(instruments[group[0]].time, block, grid, method=method)
+    return SignalBlock(grid, data, names, [inst.unit for inst in instruments])
@@ -32,11 +32,11 @@ class _VideoAnimation:
         self.add_scour = add_scour
         self.color = self.line.get_color()
         if add_scour:
-            self.scour = -inst._interp_correction()
+            self.scour = inst.bed_elevation()
             self.scour_line, = self.ax_plot.plot(self.inst.time, self.scour, label=f"{self.inst.name} Scour Depth", linestyle='--', color=self.color)
             self.scour_dot, = self.ax_plot.plot([], [], 'ro', markersize=5)
             if self.inst.name == "US3" and self.inst.corner is not None:
-                self.corner = -inst._interp_corner()
+                self.corner = inst.bed_elevation("corner")
                 self.corner_line, = self.ax_plot.plot(self.inst.time, self.corner, label="Upstream Corner Scour Depth", linestyle='--', color='#feb24c')
                 self.corner_dot, = self.ax_plot.plot([], [], 'ro', markersize=5)
         self.set_prop()
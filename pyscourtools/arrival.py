@@ -0,0 +1,63 @@
+import numpy as np
+import warnings
+from .rolling import rolling, window_samples
+
+
+def detect_arrival(time, data, baseline=5.0, smooth=0.2, high=8.0, low=3.0, hold=1.0):
+    """
+    Detect the arrival of the surge front on one or several channels sharing a time axis.
+
+    Every channel is smoothed with a rolling mean and compared with its still-water baseline, in units of the
+    baseline noise (median absolute deviation). The front arrives where the deviation exceeds high and then
+    stays above low for at least hold seconds (hysteresis); the arrival time is the start of that excursion,
+    i.e. the first sample of the run above low. All channels are processed in one pass.
+
+    Parameters:
+    time (np.array): Time axis in seconds (uniformly sampled).
+    data (np.array): 1D record or 2D (n_samples, n_channels) block.
+    baseline (float): Length in seconds of the still-water record at the start of the test.
+    smooth (float): Rolling-mean window in seconds applied before detection.
+    high (float): Deviation (in baseline noise units) that triggers a detection.
+    low (float): Deviation the signal must stay above after the trigger.
+    hold (float): Time in seconds the deviation must stay above low.
+
+    Returns:
+    np.array: Arrival time of every channel (a float for 1D data); NaN where no arrival is found.
+    """
+    time = np.asarray(time, dtype=float)
+    data = np.asarray(data, dtype=float)
+    one_channel = data.ndim == 1
+    if one_channel:
+        data = data[:, None]
+    n = len(time)
+    fs = 1 / (time[1] - time[0])
+    smoothed = rolling(data, smooth, kind="mean", fs=fs)
+    reference = smoothed[:max(window_samples(baseline, fs), 2)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(reference, axis=0)
+        noise = 1.4826 * np.nanmedian(np.abs(reference - median), axis=0)
+    # Guard against a perfectly flat baseline (e.g. zeroed data)
+    if not (noise > 0).all():
+        noise = np.where(noise > 0, noise, np.nanmax(np.abs(smoothed - median), axis=0) * 1e-3 + np.finfo(float).tiny)
+    deviation = np.abs(smoothed - median) / noise
+    # NaN samples (dropouts) neither trigger nor interrupt an excursion
+    below = deviation <= low
+    trigger = deviation > high
+    # Samples whose next hold seconds contain no sample below low
+    h = min(window_samples(hold, fs), n)
+    # Column-major, so the cumulative sums run over contiguous memory
+    index_type = np.int32 if n < 2 ** 31 else np.int64
+    cumulative = np.zeros((n + 1, data.shape[1]), dtype=index_type, order="F")
+    np.cumsum(below, axis=0, out=cumulative[1:])
+    sustained = np.zeros(data.shape, dtype=bool, order="F")
+    sustained[:n - h + 1] = cumulative[h:] == cumulative[:n - h + 1]
+    candidates = trigger & sustained
+    found = candidates.any(axis=0)
+    first = np.argmax(candidates, axis=0)
+    # Step back to the start of the excursion: one sample after the last sample below low
+    last_below = np.where(below, np.arange(n, dtype=index_type)[:, None], index_type(-1))
+    np.maximum.accumulate(last_below, axis=0, out=last_below)
+    onset = last_below[first, np.arange(data.shape[1])] + 1
+    arrival = np.where(found, time[np.minimum(onset, n - 1)], np.nan)
+    return arrival[0] if one_channel else arrival
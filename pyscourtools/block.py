@@ -0,0 +1,205 @@
+import pandas as pd
+import numpy as np
+from .instrument import Instrument
+from .timebase import UniformTime
+from .thresholds import ThresholdRules
+from .filters import ButterworthFilter
+from .rolling import rolling
+
+class SignalBlock:
+    """
+    Channels sharing one sample clock, stored as a single (n_samples, n_channels) array with one time vector.
+
+    Instruments attached to the block hold read-only column views of the array, so operations on the
+    block run once across all channels and every attached Instrument sees the result. Changes made on an
+    Instrument itself (which give it a private copy) are gathered back before the next block operation.
+    Block operations are recorded in the history of every attached Instrument as the equivalent Instrument
+    step, so rollback and rerun on an Instrument replay them on that channel.
+    """
+    def __init__(self, time, data, names, units=None) -> None:
+        # data is a (n_samples, n_channels) array or a list of channel arrays. Either way the block starts
+        # as read-only views of the source (e.g. the memory-mapped IO columns): separate channels are only
+        # stacked by the first block operation, and _make_writable copies on the first in-place write.
+        if isinstance(data, (list, tuple)):
+            columns = [Instrument._read_only(column) for column in data]
+            shape = (len(columns[0]) if columns else len(time), len(columns))
+            if any(len(column) != shape[0] for column in columns):
+                raise ValueError("Channels of a block must have the same number of samples.")
+            data = None
+        else:
+            columns = None
+            data = np.asarray(data)
+            if data.ndim == 1:
+                data = data[:, None]
+            shape = data.shape
+        if shape != (len(time), len(names)):
+            raise ValueError(f"Data of shape {shape} does not match {len(time)} samples and {len(names)} channels.")
+        self.time = Instrument._read_only(UniformTime.from_array(time))
+        self._columns = columns
+        self._data = Instrument._read_only(data) if data is not None else None
+        self.names = list(names)
+        self.units = list(units) if units is not None else [self._default_unit(name) for name in self.names]
+        self.instruments = {}
+
+    @classmethod
+    def from_instruments(cls, instruments):
+        instruments = list(instruments)
+        time = instruments[0].time
+        for inst in instruments[1:]:
+            if len(inst.time) != len(time) or not np.array_equal(inst.time, time):
+                raise ValueError(f"{inst.name} does not share the time axis of {instruments[0].name}.")
+        block = cls(time, [inst.data for inst in instruments], [inst.name for inst in instruments], [inst.unit for inst in instruments])
+        for inst in instruments:
+            block.attach(inst)
+        return block
+
+    @staticmethod
+    def _default_unit(name):
+        return "mm" if "US" in name else "m/s"
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def data(self):
+        if self._data is None:
+            data = np.empty((len(self.time), len(self._columns)), dtype=np.result_type(*self._columns), order="F")
+            for j, column in enumerate(self._columns):
+                data[:, j] = column
+            self.data = data
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._columns = None
+
+    def _column(self, j):
+        return self._columns[j] if self._columns is not None else self.data[:, j]
+
+    def column(self, name):
+        return Instrument._read_only(self._column(self.names.index(name)))
+
+    def to_frame(self):
+        columns = [f"{name} [{unit}]" for name, unit in zip(self.names, self.units)]
+        return pd.DataFrame(self.data, index=pd.Index(np.asarray(self.time), name="Time"), columns=columns)
+
+    def attach(self, inst):
+        self.instruments[inst.name] = inst
+        self._sync([inst.name])
+
+    def _make_writable(self):
+        if not self.data.flags.writeable:
+            self.data = np.array(self.data, order="F")
+
+    def _sync(self, names=None):
+        for name in names if names is not None else self.instruments:
+            inst = self.instruments[name]
+            j = self.names.index(name)
+            inst.data = Instrument._read_only(self._column(j))
+            inst.time = self.time
+            inst.unit = self.units[j]
+        # The instruments (and the snapshots in their history) now hold views of the array: freeze it, so
+        # the next in-place write to the block copies it instead of changing the data under them
+        if self._data is not None:
+            self._data.flags.writeable = False
+
+    def _snapshots(self):
+        return {name: inst._snapshot() for name, inst in self.instruments.items()}
+
+    def _record(self, states, step, params, names=None):
+        for name in names if names is not None else states:
+            inst = self.instruments[name]
+            inst.history.append({"step": step, "params": dict(params), "state": states[name]})
+            inst._trim_history()
+
+    def _views(self):
+        # Attached instruments whose data is still their block column, without a pending unit conversion
+        views = []
+        for name, inst in self.instruments.items():
+            j = self.names.index(name)
+            column = self._column(j)
+            if inst.unit == self.units[j] and len(inst._data) == len(column) and np.may_share_memory(inst._data, column):
+                views.append(name)
+        return views
+
+    def _gather(self):
+        for name, inst in self.instruments.items():
+            j = self.names.index(name)
+            column = self._column(j)
+            if len(inst.data) == len(column) and np.may_share_memory(inst.data, column):
+                continue
+            if len(inst.data) != len(self.time) or (inst.time is not self.time and not np.array_equal(inst.time, self.time)):
+                raise ValueError(f"{name} no longer shares the block time axis; call reset_data() or rebuild the block.")
+            self._make_writable()
+            self.data[:, j] = inst.data
+            self.units[j] = inst.unit
+
+    def _apply(self, func, step, params):
+        self._gather()
+        states = self._snapshots()
+        self.data = np.asfortranarray(func(self.data))
+        self._sync()
+        self._record(states, step, params)
+
+    def change_units(self, target_unit):
+        self._gather()
+        states = self._snapshots()
+        units = list(self.units)
+        factors = np.ones(len(self.names))
+        converted = False
+        for j, unit in enumerate(self.units):
+            if unit == target_unit:
+                converted = True
+            elif target_unit in Instrument.conversion_factors.get(unit, {}):
+                factors[j] = Instrument.conversion_factors[unit][target_unit]
+                self.units[j] = target_unit
+                converted = True
+        if not converted:
+            raise ValueError(f"Conversion of {', '.join(self.names)} to {target_unit} is not supported.")
+        if (factors != 1).any():
+            self.data = self.data * factors[None, :]
+        self._sync()
+        converted = [name for name in self.instruments if self.units[self.names.index(name)] != units[self.names.index(name)]]
+        self._record(states, "change_units", {"target_unit": target_unit}, converted)
+
+    def noise_reduction(self, N, Wn, fs, btype='low', zero_phase=False):
+        butterworth = ButterworthFilter(N, Wn, fs, btype=btype)
+        self._apply(lambda data: butterworth.filtfilt(data, axis=0) if zero_phase else butterworth.filter(data, axis=0),
+                    "noise_reduction", {"N": N, "Wn": Wn, "fs": fs, "btype": btype, "zero_phase": zero_phase})
+
+    def moving_average(self, window_size, min_periods=1, kind="mean", seconds=False):
+        fs = 1 / (self.time[1] - self.time[0]) if seconds else None
+        self._apply(lambda data: rolling(data, window_size, kind=kind, min_periods=min_periods, fs=fs),
+                    "moving_average", {"window_size": window_size, "min_periods": min_periods, "kind": kind, "seconds": seconds})
+
+    def cleaner(self, thresholds=None):
+        """
+        Apply threshold rules to all channels at once.
+
+        Parameters:
+        thresholds (pd.DataFrame or ThresholdRules): Rules with Instrument, Type, Start, End, Threshold and Unit
+            columns. Defaults to the thresholds of the attached instruments.
+        """
+        self._gather()
+        states = self._snapshots()
+        if thresholds is not None and not isinstance(thresholds, ThresholdRules):
+            thresholds = ThresholdRules(thresholds)
+        mask = np.zeros(self.data.shape, dtype=bool)
+        cleaned = []
+        for j, name in enumerate(self.names):
+            if thresholds is not None:
+                rules = thresholds.for_instrument(name)
+            elif name in self.instruments:
+                rules = self.instruments[name].rules
+            else:
+                rules = None
+            if rules is not None and len(rules) > 0:
+                mask[:, j] = rules.mask(self.time, self.data[:, j], self.units[j])
+                if name in self.instruments:
+                    cleaned.append(name)
+        if mask.any():
+            self._make_writable()
+            self.data[mask] = np.nan
+            self._sync()
+        self._record(states, "cleaner", {} if thresholds is None else {"thresholds": thresholds}, cleaned)
@@ -0,0 +1,224 @@
+from .experiment import Experiment
+from .compare import Compare
+from .utils import utils
+from .alignment import align
+from .correlation import lag_matrix
+from . import spectral
+from .summary import summarize
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+import os
+import time
+
+
+def _load_experiment(test_name, kwargs, preload):
+    start = time.perf_counter()
+    experiment = Experiment(test_name, **kwargs)
+    if preload is not None:
+        experiment.preload(**preload)
+    return test_name, experiment, time.perf_counter() - start
+
+
+class Campaign:
+    """
+    Set of Experiments of one test campaign, discovered from the test folders under a root directory.
+
+    Folders are recognized by the test name convention ("SC-H1-A1", "LW-H3-A0-R", ...). Each test is loaded
+    from its own folder (path=<root>/<test name>); filename and thresholds may contain "{test_name}" and are
+    resolved relative to the test folder when they exist there.
+    """
+    def __init__(self, root=".", tests=None, filename="{test_name}.txt", thresholds=None, **kwargs) -> None:
+        self.root = root
+        self.tests = list(tests) if tests is not None else self.discover(root)
+        self.filename = filename
+        self.thresholds = thresholds
+        self.kwargs = kwargs
+        self.experiments = {}
+        self.load_times = pd.Series(dtype=float, name="Load Time [s]")
+
+    @staticmethod
+    def discover(root="."):
+        return sorted(f for f in os.listdir(root) if os.path.isdir(os.path.join(root, f)) and utils.parse_test_name(f) is not None)
+
+    def _resolve(self, fname, test_name, path):
+        if fname is None:
+            return None
+        fname = fname.format(test_name=test_name)
+        if not os.path.isabs(fname) and os.path.exists(os.path.join(path, fname)):
+            return os.path.join(path, fname)
+        return fname
+
+    def _experiment_kwargs(self, test_name):
+        path = os.path.join(self.root, test_name)
+        kwargs = dict(self.kwargs)
+        kwargs["path"] = path
+        kwargs["filename"] = self._resolve(self.filename, test_name, path)
+        kwargs["thresholds"] = self._resolve(self.thresholds, test_name, path)
+        return kwargs
+
+    def load(self, tests=None, processes=None, preload=True, verbose=True):
+        """
+        Build the Experiments in a process pool.
+
+        Parameters:
+        tests (list): Test names to load. Defaults to all tests of the campaign.
+        processes (int): Number of worker processes. Defaults to the number of CPUs; 1 loads serially in this process.
+        preload (bool or dict): Build instruments, videos and scour surfaces in the workers (see Experiment.preload).
+            A dict is passed to preload as keyword arguments; False returns lazy Experiments.
+        verbose (bool): Print the load time of every test.
+
+        Returns:
+        dict: Experiments keyed by test name.
+        """
+        tests = self.tests if tests is None else list(tests)
+        if preload is True:
+            preload = {}
+        elif preload is False:
+            preload = None
+        jobs = [(test_name, self._experiment_kwargs(test_name), preload) for test_name in tests]
+        if processes == 1 or len(jobs) <= 1:
+            results = [_load_experiment(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(_load_experiment, *job) for job in jobs]
+                results = [future.result() for future in futures]
+        for test_name, experiment, seconds in results:
+            self.experiments[test_name] = experiment
+            self.load_times[test_name] = seconds
+            if verbose:
+                print(f"Loaded {test_name} in {seconds:.2f} s")
+        return {test_name: self.experiments[test_name] for test_name in tests}
+
+    def __getitem__(self, test_name):
+        if test_name not in self.experiments:
+            self.load(tests=[test_name], processes=1, verbose=False)
+        return self.experiments[test_name]
+
+    def __iter__(self):
+        return iter(self.experiments.values())
+
+    def __len__(self):
+        return len(self.experiments)
+
+    def detect_arrivals(self, tests=None, write=False, threads=None, **kwargs):
+        """
+        Detect the surge arrival on every channel of every test (see Experiment.detect_arrivals).
+
+        Parameters:
+        tests (list): Tests to process. Defaults to all tests of the campaign.
+        write (bool): Write the arrival times to each test's reach times file.
+        threads (int): Number of tests processed in parallel.
+        **kwargs: Detection parameters passed to arrival.detect_arrival.
+
+        Returns:
+        pd.DataFrame: Arrival times with one row per test and one column per instrument.
+        """
+        tests = self.tests if tests is None else list(tests)
+        experiments = [self[test_name] for test_name in tests]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(lambda experiment: experiment.detect_arrivals(write=write, **kwargs), experiments))
+        return pd.DataFrame(results, index=pd.Index(tests, name="Test"))
+
+    def align(self, instruments, tests=None, fs=None, method="linear", **kwargs):
+        """
+        Resample instruments of several tests onto one time grid, e.g. for cross-test comparisons.
+
+        Parameters:
+        instruments (str or list): Instrument name(s) taken from every test.
+        tests (list): Tests to align. Defaults to all tests of the campaign.
+        fs (float): Sampling frequency of the grid. Defaults to the lowest sampling frequency.
+        method (str): "linear", "nearest" or "decimate" (anti-aliased).
+
+        Returns:
+        SignalBlock: The aligned block, with channels named "{test}/{instrument}".
+        """
+        if isinstance(instruments, str):
+            instruments = [instruments]
+        tests = self.tests if tests is None else list(tests)
+        insts = [getattr(self[test_name], instrument) for test_name in tests for instrument in instruments]
+        names = [f"{test_name}/{instrument}" for test_name in tests for instrument in instruments]
+        return align(insts, fs=fs, method=method, names=names, **kwargs)
+
+    def lag_matrix(self, instrument, tests=None, max_lag=None, gradient=True):
+        """
+        Lags of one instrument between every pair of tests, from a single batched FFT of the aligned records.
+
+        Returns:
+        pd.DataFrame: lags[i, j] is the lag in seconds of test j relative to test i.
+        """
+        tests = self.tests if tests is None else list(tests)
+        block = self.align(instrument, tests=tests)
+        lags, _ = lag_matrix(block.data, 1 / block.time.dt, max_lag=max_lag, gradient=gradient)
+        return pd.DataFrame(lags, index=pd.Index(tests, name="Test"), columns=tests)
+
+    def align_repeats(self, reference="US1", tests=None, max_lag=None, gradient=True, apply=True):
+        """
+        Line up every repeated run ("...-R") with its original run, using the lag of the reference instrument.
+
+        Parameters:
+        reference (str): Instrument used to estimate the lag.
+        tests (list): Tests to consider. Defaults to all tests of the campaign.
+        max_lag (float): Largest lag searched, in seconds.
+        apply (bool): Shift every instrument of the repeated run by -lag, rounded to whole samples (see Instrument.to_samples).
+
+        Returns:
+        pd.Series: Lag in seconds of every repeated run relative to its original run.
+        """
+        tests = self.tests if tests is None else list(tests)
+        lags = pd.Series(dtype=float, name="Lag [s]")
+        for test_name in tests:
+            info = utils.parse_test_name(test_name)
+            original = test_name[:-2]
+            if info is None or not info["repeated"] or original not in self.tests:
+                continue
+            repeated = self[test_name]
+            lag = getattr(repeated, reference).lag_to(getattr(self[original], reference), max_lag=max_lag, gradient=gradient)
+            if apply:
+                for instrument in repeated.instruments:
+                    inst = getattr(repeated, instrument)
+                    inst.shift(-inst.to_samples(lag))
+            lags[test_name] = lag
+        return lags
+
+    def _instruments(self, instruments, tests):
+        if isinstance(instruments, str):
+            instruments = [instruments]
+        tests = self.tests if tests is None else list(tests)
+        insts = []
+        for test_name in tests:
+            experiment = self[test_name]
+            for instrument in instruments if instruments is not None else experiment.instruments:
+                insts.append(getattr(experiment, instrument))
+        return insts
+
+    def psd(self, instruments=None, tests=None, nperseg=256, noverlap=None, window="hann"):
+        """
+        Welch PSD of instruments across tests; records of equal length and rate share one batched FFT.
+
+        Returns:
+        pd.DataFrame: PSD indexed by frequency, one column per (test, instrument).
+        """
+        return spectral.psd_table(self._instruments(instruments, tests), nperseg=nperseg, noverlap=noverlap, window=window)
+
+    def band_energy(self, bands, instruments=None, tests=None, nperseg=256, noverlap=None, window="hann"):
+        """
+        Energy of instruments across tests in frequency bands, e.g. [(0.1, 1), (1, 10)].
+
+        Returns:
+        pd.DataFrame: One row per (test, instrument) and one column per band.
+        """
+        return spectral.band_table(self._instruments(instruments, tests), bands, nperseg=nperseg, noverlap=noverlap, window=window)
+
+    def summary(self, instruments=None, tests=None, detect=True, **kwargs):
+        """
+        Summary metrics of instruments across tests, computed over blocks of channels that share a clock
+        (see summary.summarize).
+
+        Returns:
+        pd.DataFrame: One row per (test, instrument), with structure, impoundment and angle columns.
+        """
+        return summarize(self._instruments(instruments, tests), detect=detect, **kwargs)
+
+    def compare(self, tests=None):
+        tests = self.tests if tests is None else tests
+        return Compare([self[test_name] for test_name in tests])
@@ -0,0 +1,163 @@
+"""
+Lag estimation by FFT cross-correlation: bore propagation between sensors, video-to-logger synchronization and
+alignment of repeated runs.
+
+A positive lag means the signal is a delayed copy of the reference: signal(t) ~ reference(t - lag). Shifting
+the signal's Instrument by -lag lines it up with the reference.
+"""
+import numpy as np
+from scipy import fft
+from scipy.ndimage import uniform_filter1d
+from .gaps import fill_gaps
+from .alignment import common_grid, resample
+
+
+def _prepare(data, gradient=False, smooth=1):
+    data = fill_gaps(np.asarray(data, dtype=float))
+    data = np.nan_to_num(data)
+    if gradient:
+        # Correlating the magnitude of the (smoothed) rate of change locks onto fronts whatever their sign
+        data = np.abs(np.gradient(uniform_filter1d(data, max(int(smooth), 1), axis=0), axis=0))
+    data = data - data.mean(axis=0)
+    scale = data.std(axis=0)
+    return data / np.where(scale > 0, scale, 1)
+
+
+def _cumulative(x):
+    cumulative = np.zeros((len(x) + 1,) + x.shape[1:])
+    np.cumsum(x, axis=0, out=cumulative[1:])
+    return cumulative
+
+
+def _pearson(products, reference, signals, lags):
+    # Turn the raw lagged products into correlation coefficients over the overlap of every lag, so long lags
+    # (short overlaps) are not penalized as they are by the zero-padded FFT correlation
+    n = len(reference)
+    count = (n - np.abs(lags))[:, None].astype(float)
+    positive = (lags >= 0)[:, None]
+    a = np.abs(lags)
+    cs, css = _cumulative(signals), _cumulative(signals ** 2)
+    cr, crr = _cumulative(reference)[:, None], _cumulative(reference ** 2)[:, None]
+    # Lag k >= 0 pairs signal[k:] with reference[:n - k]; k < 0 pairs signal[:n - |k|] with reference[|k|:]
+    sx = np.where(positive, cs[n] - cs[a], cs[n - a])
+    sxx = np.where(positive, css[n] - css[a], css[n - a])
+    sy = np.where(positive, cr[n - a], cr[n] - cr[a])
+    syy = np.where(positive, crr[n - a], crr[n] - crr[a])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pearson = (products - sx * sy / count) / np.sqrt((sxx - sx ** 2 / count) * (syy - sy ** 2 / count))
+    return np.nan_to_num(pearson, nan=-1.0)
+
+
+def _peaks(cc, lags):
+    # Parabolic interpolation of the correlation peak for sub-sample lags
+    k = np.argmax(cc, axis=0)
+    columns = np.arange(cc.shape[1])
+    peak = cc[k, columns]
+    inner = (k > 0) & (k < len(lags) - 1)
+    ki = np.clip(k, 1, len(lags) - 2)
+    before, after = cc[ki - 1, columns], cc[ki + 1, columns]
+    curvature = before - 2 * peak + after
+    with np.errstate(invalid="ignore", divide="ignore"):
+        offset = np.where(inner & (curvature < 0), 0.5 * (before - after) / curvature, 0.0)
+    return lags[k] + offset, peak
+
+
+def _max_samples(n, max_lag, fs):
+    # Lags are limited to half the record by default so every overlap holds at least half of it
+    if max_lag is None:
+        return n // 2
+    return min(int(np.ceil(max_lag * fs)), n - 2)
+
+
+def cross_correlation(reference, signals, max_lag=None, gradient=False, smooth=1):
+    """
+    Cross-correlation coefficients of one reference against several signals, from one batched FFT.
+
+    Parameters:
+    reference (np.array): 1D reference record.
+    signals (np.array): 1D record or 2D (n_samples, n_channels) block of the same length as reference.
+    max_lag (int): Largest lag in samples. Defaults to half the record length.
+    gradient (bool): Correlate the magnitude of the time derivative instead of the signals.
+    smooth (int): Moving-average length in samples applied before the derivative.
+
+    Returns:
+    tuple: (lags in samples, correlation coefficients of shape (len(lags), n_channels)).
+    """
+    signals = np.asarray(signals, dtype=float)
+    if signals.ndim == 1:
+        signals = signals[:, None]
+    n = len(reference)
+    max_lag = n // 2 if max_lag is None else min(int(max_lag), n - 2)
+    reference = _prepare(reference, gradient, smooth)
+    signals = _prepare(signals, gradient, smooth)
+    nfft = fft.next_fast_len(2 * n - 1, real=True)
+    spectrum = fft.rfft(signals, nfft, axis=0) * np.conj(fft.rfft(reference, nfft))[:, None]
+    lags = np.arange(-max_lag, max_lag + 1)
+    products = fft.irfft(spectrum, nfft, axis=0)[lags % nfft]
+    return lags, _pearson(products, reference, signals, lags)
+
+
+def estimate_lag(reference, signals, fs, max_lag=None, gradient=False, smooth=0.2):
+    """
+    Lag of every signal relative to the reference.
+
+    Parameters:
+    reference (np.array): 1D reference record.
+    signals (np.array): 1D record or 2D (n_samples, n_channels) block sampled like reference.
+    fs (float): Sampling frequency in Hz.
+    max_lag (float): Largest lag searched, in seconds. Defaults to half the record.
+    gradient (bool): Correlate the magnitude of the time derivative instead of the signals.
+    smooth (float): Smoothing in seconds applied before the derivative.
+
+    Returns:
+    tuple: (lags in seconds, peak correlation coefficients); floats for 1D signals.
+    """
+    one_channel = np.ndim(signals) == 1
+    lags, cc = cross_correlation(reference, signals, _max_samples(len(reference), max_lag, fs), gradient=gradient, smooth=round(smooth * fs))
+    lag, peak = _peaks(cc, lags)
+    lag = lag / fs
+    return (lag[0], peak[0]) if one_channel else (lag, peak)
+
+
+def lag_matrix(data, fs, max_lag=None, gradient=False, smooth=0.2):
+    """
+    Lags between every pair of channels of a block; every channel is transformed once.
+
+    Parameters:
+    data (np.array): 2D (n_samples, n_channels) block on one clock (see alignment.align).
+    fs (float): Sampling frequency in Hz.
+    max_lag (float): Largest lag searched, in seconds.
+    gradient (bool): Correlate the magnitude of the time derivative instead of the signals.
+    smooth (float): Smoothing in seconds applied before the derivative.
+
+    Returns:
+    tuple: (lags, peaks) arrays of shape (n_channels, n_channels); lags[i, j] is the lag of channel j
+        relative to channel i, in seconds.
+    """
+    data = _prepare(data, gradient, round(smooth * fs))
+    n, m = data.shape
+    index = np.arange(-_max_samples(n, max_lag, fs), _max_samples(n, max_lag, fs) + 1)
+    nfft = fft.next_fast_len(2 * n - 1, real=True)
+    spectra = fft.rfft(data, nfft, axis=0)
+    lags = np.empty((m, m))
+    peaks = np.empty((m, m))
+    for i in range(m):
+        products = fft.irfft(spectra * np.conj(spectra[:, i:i + 1]), nfft, axis=0)[index % nfft]
+        lags[i], peaks[i] = _peaks(_pearson(products, data[:, i], data, index), index)
+    return lags / fs, peaks
+
+
+def series_lag(reference_time, reference, time, data, fs=None, max_lag=None, gradient=False, smooth=0.2):
+    """
+    Lag of a series relative to a reference series sampled on another clock (e.g. a video intensity series
+    against a logger channel); both are resampled onto a common grid first.
+
+    Parameters:
+    fs (float): Sampling frequency of the common grid. Defaults to the lower of the two.
+
+    Returns:
+    tuple: (lag in seconds, peak correlation coefficient).
+    """
+    grid = common_grid([reference_time, time], fs=fs)
+    grid_fs = 1 / grid.dt
+    return estimate_lag(resample(reference_time, reference, grid), resample(time, data, grid), grid_fs, max_lag=max_lag, gradient=gradient, smooth=smooth)
@@ -0,0 +1,116 @@
+import numpy as np
+import warnings
+from .gaps import fill_gaps, nan_runs
+
+
+def _centre_and_sigma(x, robust):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if robust:
+            centre = np.nanmedian(x, axis=0)
+            return centre, 1.4826 * np.nanmedian(np.abs(x - centre), axis=0)
+        return np.nanmean(x, axis=0), np.nanstd(x, axis=0)
+
+
+def phase_space_outliers(data, robust=False):
+    """
+    One pass of the Goring & Nikora (2002) phase-space threshold on every column of a block.
+
+    The velocity u, its first difference du and second difference d2u (central differences) are compared
+    with three ellipses (u-du, du-d2u and the rotated u-d2u) whose axes are the universal threshold
+    sqrt(2 ln n) times the standard deviations. Samples outside any ellipse are outliers.
+
+    Parameters:
+    data (np.array): 2D (n_samples, n_components) block without gaps.
+    robust (bool): Use the median and the median absolute deviation instead of the mean and standard deviation.
+
+    Returns:
+    np.array: Boolean outlier mask of the shape of data.
+    """
+    centre, _ = _centre_and_sigma(data, robust)
+    u = data - centre
+    du = np.gradient(u, axis=0)
+    d2u = np.gradient(du, axis=0)
+    _, su = _centre_and_sigma(u, robust)
+    _, sdu = _centre_and_sigma(du, robust)
+    _, sd2u = _centre_and_sigma(d2u, robust)
+    lam = np.sqrt(2 * np.log(np.maximum(np.sum(~np.isnan(data), axis=0), 2)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        outside = (u / (lam * su)) ** 2 + (du / (lam * sdu)) ** 2 > 1
+        outside |= (du / (lam * sdu)) ** 2 + (d2u / (lam * sd2u)) ** 2 > 1
+        # Principal axis of the u-d2u cloud, and the ellipse axes that give the same extent along u and d2u
+        theta = np.arctan(np.nansum(u * d2u, axis=0) / np.nansum(u * u, axis=0))
+        c, s = np.cos(theta), np.sin(theta)
+        a2 = ((lam * su) ** 2 * c ** 2 - (lam * sd2u) ** 2 * s ** 2) / (c ** 4 - s ** 4)
+        b2 = ((lam * sd2u) ** 2 * c ** 2 - (lam * su) ** 2 * s ** 2) / (c ** 4 - s ** 4)
+        x = u * c + d2u * s
+        y = -u * s + d2u * c
+        rotated = x ** 2 / a2 + y ** 2 / b2 > 1
+    # Degenerate rotations (non-positive axes) skip the third test
+    outside |= rotated & ((a2 > 0) & (b2 > 0))
+    return outside
+
+
+def _run_peaks(mask, magnitude):
+    # Keep only the largest sample of every run of flagged samples: a spike also pushes its neighbours out of
+    # the derivative ellipses, and they are re-tested once the spike is removed
+    starts, lengths = nan_runs(mask)
+    peaks = np.zeros(len(mask), dtype=bool)
+    if len(starts) == 0:
+        return peaks
+    flagged = np.flatnonzero(mask)
+    values = magnitude[flagged]
+    run = np.repeat(np.arange(len(starts)), lengths)
+    largest = np.maximum.reduceat(values, np.concatenate(([0], np.cumsum(lengths)[:-1])))
+    at_peak = np.flatnonzero(values >= largest[run])
+    _, first = np.unique(run[at_peak], return_index=True)
+    peaks[flagged[at_peak[first]]] = True
+    return peaks
+
+
+def despike(data, max_iter=20, robust=False, combine=True, fill="linear", limit=None):
+    """
+    Iterative phase-space despiking of one velocity component or of several components together.
+
+    Detected spikes are removed and bridged by interpolation before the next pass, until a pass finds no new
+    spike. Existing gaps (NaN) are bridged for the derivatives only and stay NaN in the result.
+
+    Parameters:
+    data (np.array): 1D record or 2D (n_samples, n_components) block, e.g. ADV, ADV-y and ADV-z.
+    max_iter (int): Maximum number of passes.
+    robust (bool): Use median/MAD statistics (see phase_space_outliers).
+    combine (bool): A spike in one component rejects the sample in all components (same ADV ping).
+    fill (str): Interpolation of the removed samples ("linear", "nearest" or "cubic"); None leaves them NaN.
+    limit (int): Only fill runs of at most this many removed samples.
+
+    Returns:
+    tuple: (despiked data, boolean spike mask), both of the shape of data.
+    """
+    data = np.asarray(data, dtype=float)
+    one_channel = data.ndim == 1
+    block = data[:, None] if one_channel else data
+    gaps = np.isnan(block)
+    spikes = np.zeros(block.shape, dtype=bool)
+    work = block.copy()
+    for _ in range(max_iter):
+        filled = fill_gaps(work)
+        outliers = phase_space_outliers(filled, robust=robust) & ~spikes & ~gaps
+        centre, sigma = _centre_and_sigma(filled, robust)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            magnitude = np.nan_to_num(np.abs(filled - centre) / sigma)
+        if combine:
+            peaks = _run_peaks(outliers.any(axis=1), magnitude.max(axis=1))
+            new = peaks[:, None] & ~gaps & ~spikes
+        else:
+            new = np.column_stack([_run_peaks(outliers[:, j], magnitude[:, j]) for j in range(block.shape[1])])
+        if not new.any():
+            break
+        spikes |= new
+        work[new] = np.nan
+    result = work
+    if fill is not None:
+        filled = fill_gaps(work, limit=limit, method=fill)
+        result = np.where(spikes, filled, work)
+    if one_channel:
+        return result[:, 0], spikes[:, 0]
+    return result, spikes
@@ -3,14 +3,25 @@ from .video import Video
 from .instrument import Instrument
 from .animation import VideoOnScreen, VideoAsAnimation
 from .io import IO
+from .block import SignalBlock
+from .thresholds import ThresholdRules
 from .scour import ScourScatter
+from .pipeline import run_pipeline
+from .store import ProcessedStore
+from .arrival import detect_arrival
+from .alignment import align, group_by_clock
+from .correlation import estimate_lag, series_lag
+from . import spectral
+from .summary import summarize
+from .despike import despike
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import os
 
 
 class Experiment:
-    colors = {"US1": '#283747', "US2": '#0051a2', "US3": '#41ab5d', "US4": '#feb24c', "US5": '#93003a', "ADV": "#283747"}
+    colors = {"US1": '#283747', "US2": '#0051a2', "US3": '#41ab5d', "US4": '#feb24c', "US5": '#93003a', "ADV": "#283747", "ADV-y": "#6c7a89", "ADV-z": "#a3b1bf"}
     def __init__(self,
                  test_name,
                  filename=None,
@@ -27,40 +38,132 @@ class Experiment:
                  reach_times="Reach Times.csv",
                  point_cloud_fname="LiDAR/Point Cloud.txt",
                  rotate_X_start=None, rotate_X_end=None, rotate_y=None, rotate=None,
-                 apply_filter=True) -> None:
+                 apply_filter=True,
+                 mmap=False) -> None:
         self.path = path
         self.duration = duration
         self.test_name = test_name
+        self.instruments = list(instruments)
+        self.videos = [view.capitalize() for view in videos]
         if thresholds is not None:
-            self.thresholds = pd.read_csv(thresholds)
-        if use_corrected_instruments:
-            data = None
+            self.rules = ThresholdRules.from_csv(thresholds)
+            self.thresholds = self.rules.table
+        if not use_corrected_instruments:
+            self.filename = filename
+        if add_scour and os.path.exists(os.path.join(path, point_cloud_fname)):
+            self.scour_path = os.path.join(path, point_cloud_fname)
+        self._options = {"use_corrected_instruments": use_corrected_instruments, "use_filtered_instruments": use_filtered_instruments,
+                         "use_trimmed_videos": use_trimmed_videos, "reach_times": reach_times, "mmap": mmap,
+                         "scour": {"apply_filter": apply_filter, "structure": structure, "rotate": rotate, "rotate_X_start": rotate_X_start, "rotate_X_end": rotate_X_end, "rotate_y": rotate_y}}
+
+        # Instruments, videos and the scour surface are only built on first attribute access (see
+        # __getattr__); preload() builds them eagerly.
+        self._loaders = {}
+        data_attributes = ["data", "block"] if use_corrected_instruments else ["data", "block", "frequency"]
+        for name in data_attributes + self.instruments:
+            self._loaders[name] = ("_load_instruments", ())
+        for view in self.videos:
+            self._loaders[view] = ("_load_video", (view,))
+        if hasattr(self, "scour_path"):
+            self._loaders["scour"] = ("_load_scour", ())
+
+    def __getattr__(self, name):
+        loaders = self.__dict__.get("_loaders", {})
+        if name in loaders:
+            method, args = loaders[name]
+            getattr(self, method)(*args)
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        block = state.get("block")
+        if block is not None:
+            state["_block_views"] = block._views()
+        return state
+
+    def __setstate__(self, state):
+        views = state.pop("_block_views", [])
+        self.__dict__.update(state)
+        # Pickling copies the block and the instruments' column views separately; re-point the
+        # instruments that were still views of the block so they share memory again. Instruments
+        # processed on their own keep the data (and unit) pickled with them.
+        block = state.get("block")
+        if block is not None:
+            block._sync(views)
+
+    def _loaded(self, names):
+        for name in names:
+            self._loaders.pop(name, None)
+
+    def preload(self, instruments=True, videos=True, scour=True):
+        """
+        Build the lazily initialized attributes now instead of on first access.
+
+        Parameters:
+        instruments (bool): Load the logger data and build the instruments.
+        videos (bool): Build the Video objects.
+        scour (bool): Build the scour surface from the LiDAR point cloud.
+
+        Returns:
+        Experiment: The experiment itself.
+        """
+        if instruments:
+            self.data
+        if videos:
+            for view in self.videos:
+                getattr(self, view)
+        if scour and "scour" in self._loaders:
+            self.scour
+        return self
+
+    def _load_instruments(self):
+        self._loaded(["data", "block", "frequency"] + self.instruments)
+        instruments = self.instruments
+        if self._options["use_corrected_instruments"]:
+            suffix = "-filtered" if self._options["use_filtered_instruments"] else ""
+            store = ProcessedStore(os.path.join(self.path, "Processed Data", "processed.npz"))
+            if store.exists():
+                channels = store.load([instrument + suffix for instrument in instruments])
+            else:
+                channels = {}
+            columns = []
             for instrument in instruments:
-                if use_filtered_instruments:
-                    df = pd.read_csv(f"{path}/Processed Data/{instrument}-filtered.csv", index_col=0)
-                else:
-                    df = pd.read_csv(f"{path}/Processed Data/{instrument}.csv", index_col=0)
-                unit = df.columns[0].split("[")[1].split("]")[0]
-                if data is None:
-                    data = df
+                if instrument + suffix in channels:
+                    time, values, metadata = channels[instrument + suffix]
+                    unit = metadata["unit"]
+                    inst = Instrument(test_name=self.test_name, instrument=instrument, data=values, time=time, color=self.colors[instrument])
                 else:
-                    data = pd.concat([data, df.iloc[:, 0]], axis=1)
-                inst = Instrument(test_name=test_name, instrument=instrument, data=df.iloc[:, 0], color=self.colors[instrument])
+                    # Experiments processed before the store existed only have the per-channel CSV exports
+                    df = pd.read_csv(f"{self.path}/Processed Data/{instrument}{suffix}.csv", index_col=0)
+                    unit = df.columns[0].split("[")[1].split("]")[0]
+                    inst = Instrument(test_name=self.test_name, instrument=instrument, data=df.iloc[:, 0], color=self.colors[instrument])
                 inst.unit = unit
                 setattr(self, instrument, inst)
-            self.data = data
+                columns.append(pd.Series(inst.data, index=np.asarray(inst.time), name=f"{instrument} [{unit}]"))
+            self.data = pd.concat(columns, axis=1)
+            try:
+                self.block = SignalBlock.from_instruments([getattr(self, instrument) for instrument in instruments])
+            except ValueError:
+                self.block = None
         else:
-            self.filename = filename
-            io = IO(self.filename)
+            io = IO(self.filename, columns=instruments, duration=self.duration, mmap=self._options["mmap"])
             self.frequency = io.get_frequency()
             self.data = io.data
+            self.block = SignalBlock(io.time, [io.get_column(instrument) for instrument in instruments], instruments)
             
             for instrument in instruments:
-                mask = self.thresholds["Instrument"] == instrument
-                setattr(self, instrument, Instrument(test_name=test_name, instrument=instrument, data=self.data[instrument], thresholds=self.thresholds[mask], color=self.colors[instrument]))
-        for view in videos:
-            setattr(self, view.capitalize(), Video(view=view, path=path, use_trimmed_videos=use_trimmed_videos, duration=self.duration))
-        
+                rules = self.rules.for_instrument(instrument) if hasattr(self, "rules") else None
+                inst = Instrument(test_name=self.test_name, instrument=instrument, data=self.block.column(instrument), time=self.block.time, thresholds=rules, color=self.colors[instrument])
+                self.block.attach(inst)
+                setattr(self, instrument, inst)
+        self._load_scour_depth()
+        self._load_reach_times()
+
+    def _load_scour_depth(self):
+        path = self.path
+        instruments = self.instruments
         if os.path.exists(os.path.join(path, "Scour Depth")):
             for f in os.listdir(os.path.join(path, "Scour Depth")):
                 if f.endswith(".csv"):
@@ -78,16 +181,217 @@ class Experiment:
                         df = pd.read_csv(os.path.join(path, f"Scour Depth/{f}"), index_col=1)
                         instrument = getattr(self, "US3")
                         instrument.corner = df
-                                
-        if os.path.exists(os.path.join(path, reach_times)):
-            times = pd.read_csv(os.path.join(path, reach_times), index_col=0, skiprows=1, names=["Instrument", "Reach Time"])
-            for inst, row in times.iterrows():
-                instrument = getattr(self, inst)
-                instrument.reach_time = row["Reach Time"]
-        if add_scour:
-            if os.path.exists(os.path.join(path, point_cloud_fname)):
-                self.scour_path = os.path.join(path, point_cloud_fname)
-                self.scour = ScourScatter(self, apply_filter=apply_filter, structure=structure, rotate=rotate, rotate_X_start=rotate_X_start, rotate_X_end=rotate_X_end, rotate_y=rotate_y)
+
+    def _read_reach_times(self):
+        fname = os.path.join(self.path, self._options["reach_times"])
+        if not os.path.exists(fname):
+            return pd.Series(dtype=float, index=pd.Index([], name="Instrument"), name="Reach Time")
+        return pd.read_csv(fname, index_col=0, skiprows=1, names=["Instrument", "Reach Time"])["Reach Time"]
+
+    def _load_reach_times(self):
+        for inst, reach_time in self._read_reach_times().items():
+            instrument = getattr(self, inst)
+            instrument.reach_time = reach_time
+
+    def _load_video(self, view):
+        self._loaded([view])
+        setattr(self, view, Video(view=view, path=self.path, use_trimmed_videos=self._options["use_trimmed_videos"], duration=self.duration))
+
+    def _load_scour(self):
+        self._loaded(["scour"])
+        self.scour = ScourScatter(self, **self._options["scour"])
+
+    def detect_arrivals(self, instruments=None, write=False, **kwargs):
+        """
+        Detect the surge arrival on every channel and set the instruments' reach_time.
+
+        Parameters:
+        instruments (list): Instruments to process. Defaults to all instruments.
+        write (bool): Update the reach times file (default "Reach Times.csv") with the detected arrival times.
+            Entries of other instruments and of channels without a detection are kept.
+        **kwargs: Detection parameters passed to arrival.detect_arrival (baseline, smooth, high, low, hold).
+
+        Returns:
+        pd.Series: Arrival time of every instrument.
+        """
+        if instruments is None:
+            instruments = self.instruments
+        insts = [getattr(self, instrument) for instrument in instruments]
+        times = {}
+        # Channels on the same clock are detected together as one block
+        for group in group_by_clock(insts):
+            group = [insts[j] for j in group]
+            arrivals = detect_arrival(group[0].time, np.column_stack([inst.data for inst in group]), **kwargs)
+            for inst, arrival in zip(group, arrivals):
+                inst.reach_time = None if np.isnan(arrival) else float(arrival)
+                times[inst.name] = arrival
+        reach_times = pd.Series([times[instrument] for instrument in instruments], index=pd.Index(instruments, name="Instrument"), name="Reach Time")
+        if write:
+            detected = reach_times.dropna()
+            merged = self._read_reach_times()
+            merged = pd.concat([merged, detected[~detected.index.isin(merged.index)]])
+            merged.update(detected)
+            merged.rename_axis("Instrument").rename("Reach Time").to_csv(os.path.join(self.path, self._options["reach_times"]))
+        return reach_times
+
+    def align(self, instruments=None, fs=None, method="linear", **kwargs):
+        """
+        Resample instruments with different clocks (e.g. ADV and the US sensors) onto one time grid.
+
+        Parameters:
+        instruments (list): Instruments to align. Defaults to all instruments.
+        fs (float): Sampling frequency of the grid. Defaults to the lowest sampling frequency of the instruments.
+        method (str): "linear", "nearest" or "decimate" (anti-aliased).
+        **kwargs: grid, start or end of the grid (see alignment.align).
+
+        Returns:
+        SignalBlock: The aligned block.
+        """
+        if instruments is None:
+            instruments = self.instruments
+        return align([getattr(self, instrument) for instrument in instruments], fs=fs, method=method, **kwargs)
+
+    def propagation_lags(self, instruments=None, max_lag=None, gradient=True):
+        """
+        Travel time of the bore from the first instrument to the others, by cross-correlation.
+
+        Parameters:
+        instruments (list): Instruments in upstream-to-downstream order. Defaults to the US sensors.
+        max_lag (float): Largest lag searched, in seconds.
+        gradient (bool): Correlate the magnitude of the time derivative (locks onto the front).
+
+        Returns:
+        pd.Series: Lag in seconds of every instrument relative to the first one.
+        """
+        if instruments is None:
+            instruments = [instrument for instrument in self.instruments if "US" in instrument]
+        block = self.align(instruments)
+        lags, _ = estimate_lag(block.data[:, 0], block.data, 1 / block.time.dt, max_lag=max_lag, gradient=gradient)
+        return pd.Series(lags, index=pd.Index(instruments, name="Instrument"), name="Lag [s]")
+
+    def video_offset(self, view, instrument="US1", roi=None, max_lag=None, apply=False):
+        """
+        Offset between a video and the logger, from the intensity changes of the video and an instrument record.
+
+        Parameters:
+        view (str): Video view, e.g. "Side".
+        instrument (str): Instrument the video is compared with.
+        roi (tuple): (xmin, xmax, ymin, ymax) pixel region of the video where the surge is visible.
+        max_lag (float): Largest offset searched, in seconds.
+        apply (bool): Shift every instrument by the offset, rounded to whole samples, so that they line up with the video.
+
+        Returns:
+        float: Offset in seconds; positive if events appear later in the video than in the logger data.
+        """
+        inst = getattr(self, instrument)
+        time, intensity = getattr(self, view.capitalize()).intensity_series(roi=roi, end_time=self.duration)
+        offset, _ = series_lag(inst.time, inst.data, time, intensity, max_lag=max_lag, gradient=True)
+        if apply:
+            for name in self.instruments:
+                inst = getattr(self, name)
+                inst.shift(inst.to_samples(offset))
+        return offset
+
+    def despike_adv(self, components=None, max_iter=20, robust=False, combine=True, fill="linear", limit=None):
+        """
+        Despike the ADV velocity components together by iterative phase-space thresholding (Goring & Nikora).
+
+        Parameters:
+        components (list): ADV channels to process. Defaults to those of "ADV", "ADV-y" and "ADV-z" that were loaded.
+        max_iter (int): Maximum number of rejection passes.
+        robust (bool): Use median/MAD statistics instead of mean/standard deviation.
+        combine (bool): A spike in one component removes the sample from all components.
+        fill (str): Interpolation of the removed samples ("linear", "nearest" or "cubic"); None leaves them NaN.
+        limit (int): Only fill runs of at most this many removed samples.
+
+        Returns:
+        pd.Series: Number of removed samples per component.
+        """
+        if components is None:
+            components = [name for name in ["ADV", "ADV-y", "ADV-z"] if name in self.instruments]
+        insts = [getattr(self, name) for name in components]
+        if len(group_by_clock(insts)) > 1:
+            raise ValueError(f"{', '.join(components)} do not share a time axis.")
+        _, spikes = despike(np.column_stack([inst.data for inst in insts]), max_iter=max_iter, robust=robust, combine=combine, fill=None)
+        # Recorded as a step on every component (see Instrument.remove_spikes), so rollback and rerun keep it
+        for j, inst in enumerate(insts):
+            inst.remove_spikes(np.flatnonzero(spikes[:, j]).tolist(), fill=fill, limit=limit)
+        return pd.Series(spikes.sum(axis=0), index=pd.Index(components, name="Instrument"), name="Spikes")
+
+    def summary(self, instruments=None, detect=True, **kwargs):
+        """
+        Summary metrics (arrival, peak, time to peak, time integral, final bed elevation) of the instruments (see summary.summarize).
+
+        Returns:
+        pd.DataFrame: One row per (test, instrument).
+        """
+        if instruments is None:
+            instruments = self.instruments
+        return summarize([getattr(self, instrument) for instrument in instruments], detect=detect, **kwargs)
+
+    def psd(self, instruments=None, nperseg=256, noverlap=None, window="hann"):
+        """
+        Welch PSD of the instruments, computed for all channels in one batched FFT (see spectral.welch).
+
+        Returns:
+        pd.DataFrame: PSD indexed by frequency, one column per (test, instrument).
+        """
+        if instruments is None:
+            instruments = self.instruments
+        return spectral.psd_table([getattr(self, instrument) for instrument in instruments], nperseg=nperseg, noverlap=noverlap, window=window)
+
+    def band_energy(self, bands, instruments=None, nperseg=256, noverlap=None, window="hann"):
+        """
+        Energy of the instruments in frequency bands, e.g. [(0.1, 1), (1, 10)] (see spectral.band_energy).
+
+        Returns:
+        pd.DataFrame: One row per (test, instrument) and one column per band.
+        """
+        if instruments is None:
+            instruments = self.instruments
+        return spectral.band_table([getattr(self, instrument) for instrument in instruments], bands, nperseg=nperseg, noverlap=noverlap, window=window)
+
+    def save(self, instruments=None, filtered=False):
+        """
+        Save processed instruments to "Processed Data/processed.npz" under the experiment path in a single write.
+
+        Parameters:
+        instruments (list): Instruments to save. Defaults to all instruments.
+        filtered (bool): Store the channels as "{name}-filtered", read back with use_filtered_instruments=True.
+        """
+        if instruments is None:
+            instruments = self.instruments
+        suffix = "-filtered" if filtered else ""
+        store = ProcessedStore(os.path.join(self.path, "Processed Data", "processed.npz"))
+        store.write({instrument + suffix: getattr(self, instrument)._store_entry() for instrument in instruments})
+
+    def pipeline(self, stages, instruments=None, cache=True, cache_dir=None, threads=None):
+        """
+        Apply the same processing stages to several instruments, memoizing every stage on disk. Every run starts
+        from the state the instruments entered their first pipeline with, so a re-run replaces the previous one.
+
+        Parameters:
+        stages (list): (method name, parameters dict) tuples of Instrument methods, e.g.
+            [("cleaner", {}), ("interp", {"limit": 50}), ("noise_reduction", {"N": 2, "Wn": 1, "fs": 100}), ("correct_depth", {})].
+        instruments (list): Instruments to process. Defaults to all instruments.
+        cache (bool): Memoize the stages; a re-run only recomputes the stages after the first changed one.
+        cache_dir (str): Folder of the memoized stages. Defaults to "Processed Data/Pipeline" under the experiment path.
+        threads (int): Number of instruments processed in parallel. Defaults to one thread per instrument.
+
+        Returns:
+        pd.DataFrame: "cached" or "computed" for every stage (rows) and instrument (columns).
+        """
+        if instruments is None:
+            instruments = self.instruments
+        elif isinstance(instruments, str):
+            instruments = [instruments]
+        if cache and cache_dir is None:
+            cache_dir = os.path.join(self.path, "Processed Data", "Pipeline")
+        insts = [getattr(self, instrument) for instrument in instruments]
+        with ThreadPoolExecutor(max_workers=threads or len(insts) or 1) as executor:
+            status = list(executor.map(lambda inst: run_pipeline(inst, stages, cache_dir=cache_dir if cache else None), insts))
+        names = [stage if isinstance(stage, str) else stage[0] for stage in stages]
+        return pd.DataFrame(dict(zip(instruments, status)), index=pd.Index(names, name="Stage"))
 
     def plot(self, instruments=["US1", "US2", "US3", "US4"], duration=60, description=True, x_description=0.8, y_description=0.7, add_scour=False, **kwargs):
         if isinstance(instruments, str):
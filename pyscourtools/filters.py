@@ -0,0 +1,50 @@
+import numpy as np
+from scipy import signal
+from functools import lru_cache
+
+
+@lru_cache(maxsize=64)
+def _butter_sos(N, Wn, fs, btype):
+    sos = signal.butter(N, Wn, btype=btype, fs=fs, output='sos')
+    return sos
+
+
+def butter_sos(N, Wn, fs, btype='low'):
+    """
+    Second-order sections of a Butterworth filter, designed once per (N, Wn, fs, btype).
+    """
+    if np.ndim(Wn) > 0:
+        Wn = tuple(float(w) for w in Wn)
+    return _butter_sos(int(N), Wn, float(fs), btype)
+
+
+class ButterworthFilter:
+    """
+    Butterworth filter that can run causally over consecutive chunks or with zero phase over a whole record.
+
+    filter() carries the filter state (zi) from one call to the next, so feeding a record chunk by chunk gives
+    the same result as filtering it in one go, with bounded memory. filtfilt() runs the filter forward and
+    backward (no phase shift) and works along axis 0 of a 2D (n_samples, n_channels) block.
+    """
+    def __init__(self, N, Wn, fs, btype='low') -> None:
+        self.N = N
+        self.Wn = Wn
+        self.fs = fs
+        self.btype = btype
+        self.sos = butter_sos(N, Wn, fs, btype)
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def filter(self, data, axis=0):
+        data = np.asarray(data, dtype=float)
+        if self.zi is None:
+            shape = list(data.shape)
+            shape[axis] = 2
+            self.zi = np.zeros((self.sos.shape[0], *shape))
+        filtered, self.zi = signal.sosfilt(self.sos, data, axis=axis, zi=self.zi)
+        return filtered
+
+    def filtfilt(self, data, axis=0):
+        return signal.sosfiltfilt(self.sos, np.asarray(data, dtype=float), axis=axis)
@@ -0,0 +1,73 @@
+import numpy as np
+from scipy.interpolate import interp1d, CubicSpline
+
+
+def nan_runs(mask):
+    """
+    Run-length encode the True runs of a boolean mask.
+
+    Parameters:
+    mask (np.array): 1D boolean array, e.g. np.isnan(data).
+
+    Returns:
+    tuple: (starts, lengths) of every run of consecutive True values.
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+def fill_gaps(data, limit=None, method="linear"):
+    """
+    Interpolate NaN gaps over the sample index, in one vectorized call for all gaps.
+
+    Parameters:
+    data (np.array): 1D array, or 2D array whose columns are filled independently.
+    limit (int): Only gaps of at most this many samples are filled. Defaults to all gaps.
+    method (str): "linear", "nearest" or "cubic". Gaps before the first or after the last valid
+        sample take the nearest valid value.
+
+    Returns:
+    np.array: Filled copy of data.
+    """
+    data = np.array(data, dtype=float)
+    if data.ndim == 2:
+        for j in range(data.shape[1]):
+            data[:, j] = fill_gaps(data[:, j], limit=limit, method=method)
+        return data
+    invalid = np.isnan(data)
+    if not invalid.any() or invalid.all():
+        return data
+    starts, lengths = nan_runs(invalid)
+    if limit is not None:
+        keep = lengths <= limit
+        starts, lengths = starts[keep], lengths[keep]
+        if len(starts) == 0:
+            return data
+    # Mark every sample inside the selected runs with a +1/-1 edge array and a cumulative sum
+    edges = np.zeros(len(data) + 1, dtype=np.int8)
+    edges[starts] = 1
+    edges[starts + lengths] = -1
+    targets = np.flatnonzero(np.cumsum(edges[:-1]) > 0)
+    valid_indices = np.flatnonzero(~invalid)
+    valid_data = data[valid_indices]
+    if method == "linear":
+        data[targets] = np.interp(targets, valid_indices, valid_data)
+    elif method == "nearest":
+        if len(valid_indices) == 1:
+            data[targets] = valid_data[0]
+        else:
+            func = interp1d(valid_indices, valid_data, kind="nearest", bounds_error=False, fill_value=(valid_data[0], valid_data[-1]), assume_sorted=True)
+            data[targets] = func(targets)
+    elif method == "cubic":
+        if len(valid_indices) < 2:
+            data[targets] = valid_data[0]
+        else:
+            values = CubicSpline(valid_indices, valid_data)(targets)
+            values[targets < valid_indices[0]] = valid_data[0]
+            values[targets > valid_indices[-1]] = valid_data[-1]
+            data[targets] = values
+    else:
+        raise ValueError(f"Invalid interpolation method '{method}'. Choose 'linear', 'nearest' or 'cubic'.")
+    return data
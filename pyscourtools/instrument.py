@@ -1,14 +1,55 @@
 import pandas as pd
 import numpy as np
-from scipy import signal
 from .plotter import Plotter
+from .timebase import UniformTime, searchsorted, window, same_axis
+from .gaps import fill_gaps
+from .despike import despike
+from .thresholds import ThresholdRules
+from .filters import ButterworthFilter
+from .rolling import rolling
+from .store import ProcessedStore
+from .arrival import detect_arrival
 from scipy.interpolate import interp1d
 import os
+import inspect
+import functools
 import matplotlib.pyplot as plt
 from matplotlib.widgets import LassoSelector
 from matplotlib.path import Path
 
+def _record_step(method):
+    """
+    Record every call of an Instrument processing method in the instrument history (see Instrument.rollback).
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Steps called from inside another step (or while replaying) are part of that step
+        if self._recording:
+            return method(self, *args, **kwargs)
+        params = signature.bind(self, *args, **kwargs).arguments
+        params.pop("self")
+        state = self._snapshot()
+        self.history.append({"step": method.__name__, "params": dict(params), "state": state})
+        self._recording = True
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            self.history.pop()
+            self._restore(state)
+            raise
+        finally:
+            self._recording = False
+        self._trim_history()
+        return result
+    return wrapper
+
+
 class Instrument:
+    # Memory (bytes) the snapshots in the processing history may use; older snapshots are evicted
+    # and recomputed from the recorded parameters when needed. None disables the limit.
+    history_budget = 256 * 1024 ** 2
     conversion_factors = {
             "mm": {"cm": 0.1, "m": 0.001},
             "cm": {"mm": 10, "m": 0.01},
@@ -18,24 +59,130 @@ class Instrument:
             "mm/s": {"m/s": 0.001, "cm/s": 0.1}
         }
     
-    def __init__(self, test_name, instrument, data, thresholds=None, color=None) -> None:
+    def __init__(self, test_name, instrument, data, thresholds=None, color=None, time=None) -> None:
         self.test_name = test_name
         self.name = instrument
         if "US" in self.name:
             self.variable = "Surface Elevation"
         elif "ADV" in self.name:
             self.variable = "Velocity"
-        self.data = data.copy().to_numpy()
-        self.time = data.index.copy().to_numpy()
-        self.original_data = self.data.copy()
-        self.original_time = self.time.copy()
-        self.thresholds = thresholds
+        if time is None:
+            time = data.index.to_numpy()
+            data = data.to_numpy()
+        # data and time are read-only views of the source arrays (e.g. a memory-mapped cache);
+        # a private copy is only made by the first step that modifies the data in place.
+        self.data = self._read_only(data)
+        self.time = self._read_only(UniformTime.from_array(time))
+        self.original_data = self.data
+        self.original_time = self.time
+        if isinstance(thresholds, ThresholdRules):
+            self._rules = thresholds
+            self.thresholds = thresholds.table
+        else:
+            self._rules = None
+            self.thresholds = thresholds
+        self._scour_cache = {}
         self.correction = None
         self.corner = None
         self.reach_time = None
         self.color = color
+        self.history = []
+        self._recording = False
+        # (state, history length) the instrument entered its first pipeline with (see pipeline.run_pipeline)
+        self._pipeline_input = None
         self._set_instrument_info()
 
+    @classmethod
+    def from_chunks(cls, test_name, instrument, chunks, thresholds=None, color=None, filter=None):
+        """
+        Build an Instrument from a stream of (time, values) blocks, e.g. IO.iter_chunks.
+
+        Parameters:
+        chunks (iterable): (time, values) blocks; values may be 1D or a single-column 2D block.
+        thresholds (pd.DataFrame or ThresholdRules): Threshold rules applied to every block as it is read.
+        filter (dict): Butterworth parameters (N, Wn, fs, btype) applied block by block with
+            the filter state carried across blocks. Samples removed by the thresholds are held
+            at the last valid value while filtering and remain NaN in the result.
+
+        Returns:
+        Instrument: Instrument holding the processed record.
+        """
+        inst = cls(test_name, instrument, pd.Series([], dtype=float), thresholds=thresholds, color=color)
+        if filter is not None:
+            butterworth = ButterworthFilter(filter["N"], filter["Wn"], filter["fs"], btype=filter.get("btype", "low"))
+        last_valid = 0.0
+        times, blocks = [], []
+        for time, values in chunks:
+            values = np.array(values, dtype=float).reshape(len(time), -1)[:, 0]
+            if thresholds is not None:
+                values[inst._threshold_mask(time, values)] = np.nan
+            if filter is not None:
+                invalid = np.isnan(values)
+                idx = np.maximum.accumulate(np.where(invalid, -1, np.arange(len(values))))
+                held = np.where(idx >= 0, values[np.maximum(idx, 0)], last_valid)
+                if len(held) > 0:
+                    last_valid = held[-1]
+                held = butterworth.filter(held)
+                values = np.where(invalid, np.nan, held)
+            times.append(np.asarray(time, dtype=float))
+            blocks.append(values)
+        if len(times) > 0:
+            inst.data = inst._read_only(np.concatenate(blocks))
+            inst.time = inst._read_only(UniformTime.from_array(np.concatenate(times)))
+            inst.original_data = inst.data
+            inst.original_time = inst.time
+        return inst
+
+    @property
+    def data(self):
+        # Apply a pending unit conversion (see change_units) once, on first access
+        if self._scale != 1:
+            self._data = self._data * self._scale
+        self._scale = 1
+        self._data_unit = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self._scale = 1
+        self._data_unit = None
+
+    @property
+    def correction(self):
+        return self._correction
+
+    @correction.setter
+    def correction(self, table):
+        self._correction = table
+        self._scour_cache.pop("correction", None)
+
+    @property
+    def corner(self):
+        return self._corner
+
+    @corner.setter
+    def corner(self, table):
+        self._corner = table
+        self._scour_cache.pop("corner", None)
+
+    @staticmethod
+    def _read_only(array):
+        if isinstance(array, UniformTime):
+            return array
+        view = np.asarray(array).view()
+        view.flags.writeable = False
+        return view
+
+    def _make_writable(self):
+        # Works on the stored array, so NaN masking does not force a pending unit conversion
+        if not self._data.flags.writeable:
+            self._data = self._data.copy()
+
+    @property
+    def _stored_unit(self):
+        return self._data_unit if self._data_unit is not None else self.unit
+
     def _set_instrument_info(self):
         if "US" in self.name:
             self.unit = "mm"
@@ -44,6 +191,18 @@ class Instrument:
             self.unit = "m/s"
             self.label = "Velocity"
         
+    def detect_arrival(self, **kwargs):
+        """
+        Detect the surge arrival on this channel and store it as reach_time (see arrival.detect_arrival).
+
+        Returns:
+        float: Arrival time, or None if no arrival is found.
+        """
+        arrival = detect_arrival(self.time, self.data, **kwargs)
+        self.reach_time = None if np.isnan(arrival) else float(arrival)
+        return self.reach_time
+
+    @_record_step
     def correct_data(self, threshold=None):
         if "US" in self.name:
             self._correct_US(threshold=threshold)
@@ -51,45 +210,167 @@ class Instrument:
             self._correct_ADV()
 
     def _correct_US(self, threshold=None):
-        idx_reach = np.where(self.time >= self.reach_time)[0][0]
+        self._make_writable()
+        idx_reach = searchsorted(self.time, self.reach_time)
         if threshold is not None:
-           mask = (self.time < self.reach_time) & (self.data > threshold)
-           self.data[mask] = np.nan
+           before = self.data[0:idx_reach]
+           before[before > threshold] = np.nan
         sensor_height = np.nanmean(self.data[0:idx_reach])
         self.data = sensor_height - self.data
-        self.data[self.time < self.reach_time] = 0
+        self.data[0:idx_reach] = 0
 
     def _correct_ADV(self):
-        self.data[self.time < self.reach_time] = 0
+        self._make_writable()
+        self.data[0:searchsorted(self.time, self.reach_time)] = 0
 
+    @_record_step
     def get_duration(self, duration):
         self.duration = duration
-        mask = self.time < duration
-        self.data = self.data[mask]
-        self.time = self.time[mask]
+        selection = window(self.time, end=duration)
+        self._data = self._data[selection]
+        self.time = self.time[selection]
 
     def get_frequency(self):
+        if isinstance(self.time, UniformTime):
+            return 1 / self.time.dt
         return 1 / (self.time[1] - self.time[0])
     
-    def change_units(self, target_unit):
+    def get_conversion_factor(self, target_unit):
         if self.unit == target_unit:
-            return
-        
+            return 1
         # Determine the type of data: water depth or velocity
         if self.unit in self.conversion_factors and target_unit in self.conversion_factors[self.unit]:
-            factor = self.conversion_factors[self.unit][target_unit]
-            self.data = self.data * factor
-            self.unit = target_unit
+            return self.conversion_factors[self.unit][target_unit]
+        raise ValueError(f"Conversion from {self.unit} to {target_unit} is not supported.")
+
+    @_record_step
+    def change_units(self, target_unit):
+        """
+        Convert the data to target_unit in O(1): the factor is kept pending and applied on the next access to data.
+        """
+        if self.unit == target_unit:
+            return
+        factor = self.get_conversion_factor(target_unit)
+        stored_unit = self._stored_unit
+        self.unit = target_unit
+        if target_unit == stored_unit:
+            # Back to the unit the data is stored in: drop the factor instead of accumulating round-off
+            self._scale = 1
+            self._data_unit = None
         else:
-            raise ValueError(f"Conversion from {self.unit} to {target_unit} is not supported.")
+            self._scale = self._scale * factor
+            self._data_unit = stored_unit
         
     def reset_data(self):
-        self.data = self.original_data.copy()
-        self.time = self.original_time.copy()
+        self.data = self.original_data
+        self.time = self.original_time
+        self.history = []
+        self._pipeline_input = None
+
+    def _snapshot(self):
+        # Freezing the array makes it copy-on-write: the next step that edits it in place copies it first
+        if isinstance(self._data, np.ndarray) and self._data.flags.writeable:
+            self._data.flags.writeable = False
+        return {"data": self._data, "scale": self._scale, "data_unit": self._data_unit, "unit": self.unit,
+                "time": self.time, "duration": self.__dict__.get("duration")}
+
+    def _restore(self, state):
+        self._data = state["data"]
+        self._scale = state["scale"]
+        self._data_unit = state["data_unit"]
+        self.unit = state["unit"]
+        self.time = state["time"]
+        if state["duration"] is not None:
+            self.duration = state["duration"]
 
-    def noise_reduction(self, N, Wn, fs, btype='low'):
-        sos = signal.butter(N, Wn, btype=btype, fs=fs, output='sos')
-        self.data = signal.sosfilt(sos, self.data)
+    def _history_nbytes(self):
+        # Snapshots shared with the original data, the current data or another snapshot cost nothing extra
+        seen = set()
+        total = 0
+        for entry in self.history:
+            data = entry["state"]["data"]
+            if data is None or id(data) in seen or data is self._data or np.may_share_memory(data, self.original_data):
+                continue
+            seen.add(id(data))
+            total += data.nbytes
+        return total
+
+    def _trim_history(self):
+        if self.history_budget is None:
+            return
+        # The first snapshot is the anchor every replay starts from and is never evicted
+        for entry in self.history[1:]:
+            if self._history_nbytes() <= self.history_budget:
+                break
+            entry["state"]["data"] = None
+
+    def _replay(self, entries):
+        self._recording = True
+        try:
+            for entry in entries:
+                getattr(self, entry["step"])(**entry["params"])
+        finally:
+            self._recording = False
+
+    def rollback(self, step):
+        """
+        Return to the state before a step of the history and drop that step and everything after it.
+
+        Parameters:
+        step (int): Index of the step in self.history; negative values count from the end.
+        """
+        if step < 0:
+            step += len(self.history)
+        if not 0 <= step <= len(self.history):
+            raise IndexError(f"No step {step} in a history of {len(self.history)} steps.")
+        if step == len(self.history):
+            return
+        # Start from the closest snapshot that was not evicted and recompute the steps in between
+        anchor = step
+        while self.history[anchor]["state"]["data"] is None:
+            anchor -= 1
+        self._restore(self.history[anchor]["state"])
+        self._replay(self.history[anchor:step])
+        del self.history[step:]
+
+    def undo(self, steps=1):
+        """
+        Undo the last steps of the history.
+        """
+        self.rollback(max(len(self.history) - steps, 0))
+
+    def rerun(self, step, **params):
+        """
+        Re-run the history from a step with changed parameters, replaying only that step and the ones after it.
+
+        Parameters:
+        step (int): Index of the step in self.history; negative values count from the end.
+        **params: Parameters of that step to change, e.g. rerun(2, limit=50) for an interp step.
+        """
+        if step < 0:
+            step += len(self.history)
+        entries = [dict(entry, params=dict(entry["params"])) for entry in self.history[step:]]
+        if len(entries) == 0:
+            raise IndexError(f"No step {step} in a history of {len(self.history)} steps.")
+        entries[0]["params"].update(params)
+        self.rollback(step)
+        for entry in entries:
+            getattr(self, entry["step"])(**entry["params"])
+
+    @_record_step
+    def noise_reduction(self, N, Wn, fs, btype='low', zero_phase=False):
+        """
+        Apply a Butterworth filter.
+
+        Parameters:
+        N (int): Filter order.
+        Wn (float or list): Critical frequency (or frequencies for band filters) in Hz.
+        fs (float): Sampling frequency in Hz.
+        btype (str): Filter type. Defaults to 'low'.
+        zero_phase (bool): Filter forward and backward (sosfiltfilt) so the signal is not phase-shifted.
+        """
+        butterworth = ButterworthFilter(N, Wn, fs, btype=btype)
+        self.data = butterworth.filtfilt(self.data) if zero_phase else butterworth.filter(self.data)
 
     def find_consecutive_runs(self, data):
         runs = []
@@ -105,55 +386,132 @@ class Instrument:
             runs.append((start_idx, prev_idx))
         return runs
 
-    def interp(self, limit=None):
-        if limit is None:
-            limit = len(self.data)
-        valid_indices = np.where(~np.isnan(self.data))[0]
-        invalid_indices = np.where(np.isnan(self.data))[0]
-        valid_data = self.data[valid_indices]
-        consecutive_runs = self.find_consecutive_runs(invalid_indices)
-        for run in consecutive_runs:
-            run_length = run[1] - run[0] + 1
-            if run_length <= limit:
-                interp_indices = np.arange(run[0], run[1] + 1)
-                self.data[interp_indices] = np.interp(interp_indices, valid_indices, valid_data)
+    @_record_step
+    def interp(self, limit=None, method="linear"):
+        """
+        Fill NaN gaps of at most limit samples.
+
+        Parameters:
+        limit (int): Longest gap (in samples) to fill. Defaults to all gaps.
+        method (str): "linear", "nearest" or "cubic".
+        """
+        self.data = fill_gaps(self.data, limit=limit, method=method)
         
-    def cleaner(self):
-        for _, row in self.thresholds.iterrows():
-            unit = self.unit
-            self.change_units(row["Unit"])
-            if row["Type"].lower() == "g":
-                mask = (self.time > row["Start"]) & (self.time < row["End"]) & (self.data > row["Threshold"])
-                self.data[mask] = np.nan
-            elif row["Type"].lower() == "l":
-                mask = (self.time > row["Start"]) & (self.time < row["End"]) & (self.data < row["Threshold"])
-                self.data[mask] = np.nan
-            self.change_units(unit)
+    @_record_step
+    def despike(self, max_iter=20, robust=False, fill="linear", limit=None):
+        """
+        Remove spikes by iterative phase-space thresholding (Goring & Nikora), e.g. on ADV velocities.
+        Experiment.despike_adv processes the three ADV components together.
 
+        Parameters:
+        max_iter (int): Maximum number of rejection passes.
+        robust (bool): Use median/MAD statistics instead of mean/standard deviation.
+        fill (str): Interpolation of the removed samples ("linear", "nearest" or "cubic"); None leaves them NaN.
+        limit (int): Only fill runs of at most this many removed samples.
+
+        Returns:
+        np.array: Boolean mask of the removed samples.
+        """
+        self.data, spikes = despike(self.data, max_iter=max_iter, robust=robust, fill=fill, limit=limit)
+        return spikes
+
+    @_record_step
+    def remove_spikes(self, samples, fill="linear", limit=None):
+        """
+        Remove the given samples and bridge them by interpolation, e.g. the spikes Experiment.despike_adv finds
+        on the ADV components together. The samples are recorded, so a replay removes the same samples.
+
+        Parameters:
+        samples (list): Indices of the samples to remove.
+        fill (str): Interpolation of the removed samples ("linear", "nearest" or "cubic"); None leaves them NaN.
+        limit (int): Only fill runs of at most this many removed samples.
+        """
+        spikes = np.zeros(len(self._data), dtype=bool)
+        spikes[samples] = True
+        data = np.where(spikes, np.nan, self.data)
+        if fill is not None:
+            data = np.where(spikes, fill_gaps(data, limit=limit, method=fill), data)
+        self.data = data
+
+    @_record_step
+    def cleaner(self, thresholds=None):
+        """
+        Remove the samples that violate the threshold rules.
+
+        Parameters:
+        thresholds (pd.DataFrame or ThresholdRules): Rules to apply instead of the instrument's thresholds; only
+            the rules of this instrument are used (e.g. the rules passed to SignalBlock.cleaner).
+        """
+        if thresholds is None:
+            rules = self.rules
+        else:
+            rules = (thresholds if isinstance(thresholds, ThresholdRules) else ThresholdRules(thresholds)).for_instrument(self.name)
+        # Thresholds are compiled in the unit of the stored data, so a pending conversion is not applied here
+        mask = rules.mask(self.time, self._data, self._stored_unit)
+        if mask.any():
+            self._make_writable()
+            self._data[mask] = np.nan
+
+    @property
+    def rules(self):
+        if self.thresholds is None:
+            return None
+        if self._rules is None or not self._rules.matches(self.thresholds):
+            self._rules = ThresholdRules(self.thresholds)
+        return self._rules
+
+    def _threshold_mask(self, time, data):
+        return self.rules.mask(time, data, self.unit)
+
+    @_record_step
     def remove_negatives(self, threshold=0):
-        self.data[self.data < threshold] = np.nan
+        self._make_writable()
+        self._data[self._data < threshold / self._scale] = np.nan
         
 
+    @_record_step
     def normalize(self, d0):
         self.data = self.data / d0
         self.time = self.time * np.sqrt(9.81 / d0)
 
+    @_record_step
     def remove_value(self, value, threshold = 0.001):
         mask = np.abs(self.data - value) < threshold
+        self._make_writable()
         self.data[mask] = np.nan
 
+    @_record_step
     def remove_points(self):
-        if not os.path.exists(f"{self.name}.csv"):
+        mask = SelectPoints.load_mask(f"{self.name}-points.npy", len(self._data), legacy_file=f"{self.name}.csv")
+        if mask is None:
             print(f"No file found for {self.name}!")
             return
-        data = pd.read_csv(f"{self.name}.csv", header=None, names=["Index"])
-        indices = data["Index"].to_numpy()
-        self.data[indices] = np.nan
+        self._make_writable()
+        self._data[mask] = np.nan
+
+    def _store_entry(self):
+        metadata = {"unit": self.unit, "test_name": self.test_name,
+                    "steps": [{"step": entry["step"], "params": entry["params"]} for entry in self.history]}
+        return self.time, self.data, metadata
+
+    def save(self, filtered=False, fname="Processed Data/processed.npz"):
+        """
+        Save the processed data to the experiment's processed-data store, next to the channels already stored there.
+
+        Parameters:
+        filtered (bool): Store the channel as "{name}-filtered".
+        fname (str): Store file.
+        """
+        key = f"{self.name}-filtered" if filtered else self.name
+        ProcessedStore(fname).write({key: self._store_entry()})
 
     def to_csv(self, filtered=False):
+        """
+        Export the processed data as a CSV file in "Processed Data". Use save() for data that is read back.
+        """
         if not os.path.exists("Processed Data"):
             os.mkdir("Processed Data")
-        df = pd.DataFrame(data=self.data, index=self.time, columns=[self.name + " [" + self.unit + "]"])
+        df = pd.DataFrame(data=self.data, index=np.asarray(self.time), columns=[self.name + " [" + self.unit + "]"])
         if filtered:
             df.to_csv(f"Processed Data/{self.name}-filtered.csv")
         else:
@@ -171,10 +529,10 @@ class Instrument:
         fig, ax = plot.plot(self.time, self.data, label=f"{self.variable} - {label}", color=color, marker=marker)
         if add_scour:
             try:
-                scour = -self._interp_correction()
+                bed = self.bed_elevation()
                 color = ax[0].lines[-1].get_color()
-                if scour is not None:
-                    plot.plot(self.time, scour, color=color, linestyle="--", label=f"Bed Elevation - {label}")
+                if bed is not None:
+                    plot.plot(self.time, bed, color=color, linestyle="--", label=f"Bed Elevation - {label}")
             except:
                 pass
         if add_final_scour:
@@ -187,114 +545,213 @@ class Instrument:
             plot.set_prop(xlabel="Time [s]", ylabel=f"{self.label} [{self.unit}]", title=self.test_name, legend=True, grid=False, **kwargs)
         return plot
 
-    def moving_average(self, window_size, min_periods=1):
+    @_record_step
+    def moving_average(self, window_size, min_periods=1, kind="mean", seconds=False):
         """
         Calculate the moving average of a numpy array, handling NaN values.
         
         Parameters:
-        data (np.array): Input data array.
-        window_size (int): Size of the moving average window.
+        window_size (int or float): Size of the moving average window, in samples or in seconds if seconds is True.
         min_periods (int): Minimum number of observations in window required to have a value. Defaults to 1.
-        
-        Returns:
-        np.array: Array of moving averages.
+        kind (str): Rolling statistic: "mean", "median", "std", "min" or "max". Defaults to "mean".
+        seconds (bool): Interpret window_size in seconds.
         """
-        self.data = pd.Series(self.data).rolling(window=window_size, min_periods=min_periods).mean().to_numpy()
+        fs = self.get_frequency() if seconds else None
+        self.data = rolling(self.data, window_size, kind=kind, min_periods=min_periods, fs=fs)
 
-    def time_based_moving_average(self, start_time, end_time, window_size, min_periods=1):
+    @_record_step
+    def time_based_moving_average(self, start_time, end_time, window_size, min_periods=1, kind="mean", seconds=False):
         """
-        Calculate the moving average of data for time less than average_time.
+        Calculate the moving average of data for start_time <= time < end_time.
         
         Parameters:
-        time (np.array): Input time array.
-        data (np.array): Input data array.
-        average_time (float): Time threshold for moving average.
-        window_size (int): Size of the moving average window.
+        start_time (float): Start of the averaged window.
+        end_time (float): End of the averaged window.
+        window_size (int or float): Size of the moving average window, in samples or in seconds if seconds is True.
         min_periods (int): Minimum number of observations in window required to have a value. Defaults to 1.
-        
-        Returns:
-        np.array: Array with moving averages where time < average_time and original data otherwise.
+        kind (str): Rolling statistic: "mean", "median", "std", "min" or "max". Defaults to "mean".
+        seconds (bool): Interpret window_size in seconds.
         """
         
-        # Identify indices where time is less than average_time
-        indices = np.where((self.time < end_time) & (self.time >= start_time))[0]
+        # Identify the window start_time <= time < end_time
+        indices = window(self.time, start_time, end_time)
         
-        # Initialize the result array
-        result = np.copy(self.data)
-        
-        # Apply moving average to the subset where time < average_time
-        if len(indices) > 0:
-            subset_data = self.data[indices]
-            moving_avg = pd.Series(subset_data).rolling(window=window_size, min_periods=min_periods).mean().to_numpy()
-            result[indices] = moving_avg
-        
-        # For the subset where time >= average_time, the result array already contains the original data
-        self.data = result
+        # Apply the moving average in place to the subset inside the window; the rest keeps the original data
+        if indices.stop > indices.start:
+            fs = self.get_frequency() if seconds else None
+            moving_avg = rolling(self.data[indices], window_size, kind=kind, min_periods=min_periods, fs=fs)
+            self._make_writable()
+            self.data[indices] = moving_avg
 
+    @_record_step
     def shift(self, shift_value):
-        self.time = self.time + shift_value
-        new_times = np.arange(0, self.time[0], 1/self.get_frequency())
-        new_data = np.full(len(new_times), 0)
-        self.time = np.concatenate((new_times, self.time))
-        self.data = np.concatenate((new_data, self.data))
-        mask = self.time < self.duration
-        self.time = self.time[mask]
-        self.data = self.data[mask]
+        dt = 1 / self.get_frequency()
+        time = self.time + shift_value
+        # Zero padding on the grid 0, dt, ... up to the shifted record, as np.arange(0, time[0], dt)
+        n_pad = max(int(np.ceil(time[0] / dt - 1e-9)), 0)
+        if isinstance(time, UniformTime) and abs(time[0] - n_pad * dt) < 1e-6 * dt:
+            time = UniformTime(time[0] - n_pad * dt, dt, n_pad + len(time))
+        elif n_pad > 0:
+            time = UniformTime.from_array(np.concatenate((np.arange(n_pad) * dt, np.asarray(time))))
+        selection = window(time, end=self.__dict__.get("duration"))
+        # Only the part kept after trimming to the duration is allocated
+        n = selection.stop - selection.start
+        data = np.zeros(n)
+        kept = max(min(n - n_pad, len(self._data)), 0)
+        data[n_pad:n_pad + kept] = self.data[selection.start:selection.start + kept]
+        self.time = time[selection]
+        self.data = data
+
+    def lag_to(self, reference, max_lag=None, gradient=False, fs=None):
+        """
+        Lag of this instrument relative to a reference instrument (e.g. the same sensor in the original run), by
+        cross-correlation on their common time grid.
+
+        Parameters:
+        reference (Instrument): Reference instrument.
+        max_lag (float): Largest lag searched, in seconds.
+        gradient (bool): Correlate the magnitude of the time derivative (locks onto fronts).
+        fs (float): Sampling frequency of the common grid. Defaults to the lower of the two.
+
+        Returns:
+        float: Lag in seconds; positive if this instrument sees events later than the reference.
+        """
+        from .correlation import series_lag
+        lag, _ = series_lag(reference.time, reference.data, self.time, self.data, fs=fs, max_lag=max_lag, gradient=gradient)
+        return lag
+
+    def align_to(self, reference, max_lag=None, gradient=False, fs=None):
+        """
+        Shift this instrument in time so that it lines up with a reference instrument (see lag_to).
+
+        Returns:
+        float: The lag that was removed, in seconds (the estimated lag rounded to whole samples).
+        """
+        lag = self.to_samples(self.lag_to(reference, max_lag=max_lag, gradient=gradient, fs=fs))
+        self.shift(-lag)
+        return lag
+
+    def to_samples(self, seconds):
+        """
+        Round a time offset (e.g. an estimated lag) to a whole number of samples, so that shifting by it keeps
+        the time axis uniform.
+        """
+        dt = 1 / self.get_frequency()
+        return round(seconds / dt) * dt
 
+    @_record_step
     def correct_depth(self):
         if self.correction is None:
             print(f"No correction data available for {self.name}!")
             return
         else:
-            unit = self.unit
-            self.change_units(self.correction["Unit"].iloc[0])
-            interp_depth = self._interp_correction()
-            self.data = self.data + interp_depth
-            self.change_units(unit)
+            self.data = self.data + self.scour_depth()
 
-    def _interp_correction(self):
-        if self.correction is not None:
-            correction_time = self.correction.index.to_numpy()
-            correction_data = self.correction["Scour depth"].to_numpy().flatten()
-            interp_func = interp1d(correction_time, correction_data, kind="linear", fill_value="extrapolate")
-            interp_depth = interp_func(self.time)
-            return interp_depth
-        else:
+    def scour_depth(self, kind="correction"):
+        """
+        Scour depth of the correction (or corner) table interpolated onto the time axis, in the instrument unit.
+
+        The interpolated series is cached and only recomputed after the table, the time axis or the unit changes.
+
+        Parameters:
+        kind (str): "correction" or "corner".
+
+        Returns:
+        np.array: Read-only scour depth at every sample, or None if the table is not available.
+        """
+        if kind not in ("correction", "corner"):
+            raise ValueError(f"Invalid scour table '{kind}'. Choose 'correction' or 'corner'.")
+        table = getattr(self, kind)
+        if table is None:
             return None
-        
+        cached = self._scour_cache.get(kind)
+        if cached is None or cached["unit"] != self.unit or not same_axis(cached["time"], self.time):
+            interp_func = interp1d(table.index.to_numpy(), table["Scour depth"].to_numpy().flatten(), kind="linear", fill_value="extrapolate")
+            depth = interp_func(np.asarray(self.time))
+            # The table may be in another unit than the data; get_conversion_factor converts data -> table
+            if "Unit" in table.columns:
+                depth = depth / self.get_conversion_factor(table["Unit"].iloc[0])
+            cached = {"time": self.time, "unit": self.unit, "depth": self._read_only(depth), "bed": self._read_only(-depth)}
+            self._scour_cache[kind] = cached
+        return cached["depth"]
+
+    def bed_elevation(self, kind="correction"):
+        """
+        Bed elevation (negative scour depth) on the time axis, in the instrument unit. See scour_depth.
+        """
+        if self.scour_depth(kind) is None:
+            return None
+        return self._scour_cache[kind]["bed"]
+
+    def _interp_correction(self):
+        return self.scour_depth("correction")
+
     def _interp_corner(self):
-        if self.corner is not None:
-            corner_time = self.corner.index.to_numpy()
-            corner_data = self.corner["Scour depth"].to_numpy().flatten()
-            interp_func = interp1d(corner_time, corner_data, kind="linear", fill_value="extrapolate")
-            interp_depth = interp_func(self.time)
-            return interp_depth
-        
+        return self.scour_depth("corner")
+
     def point_selector(self, new_file=False, **kwargs):
         plot = self.plot(marker=True, **kwargs)
         ax = plot.ax[0]
-        selector = SelectPoints(ax, self.time, self.data, f"{self.name}.csv", new_file=new_file)
+        selector = SelectPoints(ax, np.asarray(self.time), self.data, f"{self.name}-points.npy", new_file=new_file, legacy_file=f"{self.name}.csv")
         plt.show()
         
 class SelectPoints:
-    def __init__(self, ax, x, y, output_file, new_file):
+    """
+    Lasso selection of samples to remove. The selection is kept as a boolean mask over the samples and saved to
+    output_file (a .npy file), so selecting a point twice or across sessions never duplicates it.
+    """
+    def __init__(self, ax, x, y, output_file, new_file, legacy_file=None):
         self.ax = ax
-        self.x = x
-        self.y = y
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.points = np.column_stack((self.x, self.y))
+        self.sorted = len(self.x) < 2 or bool(np.all(np.diff(self.x) >= 0))
         self.output_file = output_file
-        if new_file and os.path.exists(output_file):
-            os.remove(output_file)
-        self.selected_points = []
+        if new_file:
+            for fname in (output_file, legacy_file):
+                if fname is not None and os.path.exists(fname):
+                    os.remove(fname)
+        mask = self.load_mask(output_file, len(self.x), legacy_file=legacy_file)
+        self.mask = mask if mask is not None else np.zeros(len(self.x), dtype=bool)
         self.lasso = LassoSelector(ax, onselect=self.onselect)
-        # self.ax.plot(x, y, marker='o')
-        
+
+    @staticmethod
+    def load_mask(output_file, n, legacy_file=None):
+        """
+        Read a saved selection as a boolean mask over n samples.
+
+        Parameters:
+        output_file (str): Mask file written by SelectPoints.
+        n (int): Number of samples; longer masks are cut and shorter ones padded with False.
+        legacy_file (str): Text file with one selected index per line, as written by earlier versions; merged in.
+
+        Returns:
+        np.array: Boolean mask, or None if neither file exists.
+        """
+        if not os.path.exists(output_file) and (legacy_file is None or not os.path.exists(legacy_file)):
+            return None
+        mask = np.zeros(n, dtype=bool)
+        if os.path.exists(output_file):
+            saved = np.load(output_file)[:n]
+            mask[:len(saved)] = saved
+        if legacy_file is not None and os.path.exists(legacy_file):
+            indices = np.atleast_1d(np.loadtxt(legacy_file, dtype=int, ndmin=1))
+            mask[indices[indices < n]] = True
+        return mask
+
     def onselect(self, verts):
         path = Path(verts)
-        ind = path.contains_points(list(zip(self.x, self.y)))
-        selected_indices = np.where(ind)[0]
-        with open(self.output_file, 'a') as f:
-            for index in selected_indices:
-                f.write(f"{index}\n")
-        # print(f"Saved {len(selected_data)} points to {output_file}")
-        self.ax.scatter(self.x[ind], self.y[ind], color='red')
+        xmin, ymin = np.min(verts, axis=0)
+        xmax, ymax = np.max(verts, axis=0)
+        # Only the samples inside the lasso's bounding box are tested against the polygon
+        if self.sorted:
+            first = np.searchsorted(self.x, xmin, side="left")
+            last = np.searchsorted(self.x, xmax, side="right")
+            candidates = first + np.flatnonzero((self.y[first:last] >= ymin) & (self.y[first:last] <= ymax))
+        else:
+            candidates = np.flatnonzero((self.x >= xmin) & (self.x <= xmax) & (self.y >= ymin) & (self.y <= ymax))
+        selected = candidates[path.contains_points(self.points[candidates])]
+        self.mask[selected] = True
+        np.save(self.output_file, self.mask)
+        self.ax.scatter(self.x[selected], self.y[selected], color='red')
         plt.draw()
\ No newline at end of file
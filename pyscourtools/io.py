@@ -1,16 +1,212 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
+import os
 
 class IO:
-    def __init__(self, fname) -> None:
+    columns = ["Time", "US1", "US2", "US3", "US4", "US5", "ADV", "ADV-y", "ADV-z"]
+
+    def __init__(self, fname, columns=None, start=None, duration=None, use_cache=True, cache_dtype="float64", mmap=False, load=True) -> None:
         self.fname = fname
-        
+        if isinstance(columns, str):
+            columns = [columns]
+        self.selection = list(columns) if columns is not None else self.columns[1:]
+        self.start = start
+        self.duration = duration
+        self.mmap = mmap
+        self.use_cache = use_cache or mmap
+        self.cache_dtype = np.dtype(cache_dtype)
+        self.cache_fname = f"{self.fname}.cache.npy"
+        self.cache_time_fname = f"{self.fname}.cache.time.npy"
+        self.cache_key_fname = f"{self.fname}.cache.json"
+        self.data = None
+        if not load:
+            return
+
+        # The cache always holds the full record: on a miss the whole file is parsed once and
+        # cached, and the requested window and columns are read from it. Only uncached windowed
+        # loads go through the chunked reader, which stops at the end of the window.
+        windowed = columns is not None or start is not None or duration is not None
         try:
-            self.data = pd.read_csv(self.fname, delim_whitespace=True, skiprows=1, header=None, names=["Time", "US1", "US2", "US3", "US4", "US5", "ADV", "ADV-y", "ADV-z"], usecols=[0,1,2,3,4,5,6,7,8], index_col=0)
+            if self.use_cache:
+                cached = self._read_cache()
+                if cached is None:
+                    self.data = self._read_text()
+                    if self._write_cache():
+                        cached = self._read_cache()
+                if cached is not None:
+                    self.data = self._select_table(*cached)
+            if self.data is None:
+                self.data = self._read_window() if windowed else self._read_text()
+            self.data = self._select(self.data)
         except FileNotFoundError:
             print(f"Error: {self.fname} not found!")
             self.data = None
 
+    def _read_text(self):
+        return pd.read_csv(self.fname, sep=r"\s+", skiprows=1, header=None, names=self.columns, usecols=list(range(len(self.columns))), index_col=0)
+
+    def _read_window(self):
+        times, blocks = [], []
+        for time, values in self.iter_chunks(chunk_rows=20000, columns=self.selection, duration=self.duration):
+            times.append(time)
+            blocks.append(values)
+        index = pd.Index(np.concatenate(times) if times else [], dtype=float, name=self.columns[0])
+        values = np.concatenate(blocks) if blocks else np.empty((0, len(self.selection)))
+        return pd.DataFrame(values, index=index, columns=self.selection)
+
+    def _bounds(self, time):
+        first = 0 if self.start is None else np.searchsorted(time, self.start, side="left")
+        last = len(time) if self.duration is None else np.searchsorted(time, self.duration, side="left")
+        return first, last
+
+    def _select(self, data):
+        time = data.index.to_numpy()
+        first, last = self._bounds(time)
+        if first == 0 and last == len(time) and list(data.columns) == self.selection:
+            return data
+        # A copy, so the selection does not keep the full table alive
+        return data.iloc[first:last][self.selection].copy()
+
+    def _file_hash(self):
+        sha = hashlib.sha1()
+        with open(self.fname, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    def _cache_key(self, content_hash=None):
+        stat = os.stat(self.fname)
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash, "dtype": self.cache_dtype.name, "time_dtype": "float64", "columns": self.columns}
+
+    def _cache_valid(self):
+        """
+        Check whether the sidecar cache still matches the source file.
+
+        The size and mtime are checked first; the content hash is only computed when the
+        mtime changed (e.g. the file was copied or touched), in which case an unchanged
+        hash revalidates the cache instead of forcing a re-parse.
+        """
+        key = self._cache_key()
+        if not all(os.path.exists(fname) for fname in [self.cache_fname, self.cache_time_fname, self.cache_key_fname]):
+            return False
+        with open(self.cache_key_fname) as f:
+            cached_key = json.load(f)
+        if any(cached_key.get(item) != key[item] for item in ["size", "dtype", "time_dtype", "columns"]):
+            return False
+        if cached_key.get("mtime") != key["mtime"]:
+            content_hash = self._file_hash()
+            if cached_key.get("hash") != content_hash:
+                return False
+            key["hash"] = content_hash
+            self._write_key(key)
+        return True
+
+    def _read_cache(self):
+        if not self._cache_valid():
+            return None
+        return np.load(self.cache_time_fname, mmap_mode="r"), np.load(self.cache_fname, mmap_mode="r")
+
+    def _select_table(self, time, table):
+        # time and table are memory-mapped. Without mmap only the requested window and columns are
+        # copied out of the cache file, so the full record is never held in memory.
+        first, last = self._bounds(time)
+        indices = [self.columns.index(column) - 1 for column in self.selection]
+        if not self.mmap:
+            values = np.empty((last - first, len(indices)), dtype=table.dtype, order="F")
+            for k, j in enumerate(indices):
+                values[:, k] = table[first:last, j]
+            index = pd.Index(np.array(time[first:last]), name=self.columns[0], copy=False)
+            return pd.DataFrame(values, index=index, columns=self.selection, copy=False)
+        # In mmap mode rows and columns are sliced on the array rather than on a DataFrame, so every
+        # column of self.data stays a read-only view into the cache file. Evenly spaced columns are
+        # one 2D view; other selections (e.g. US1-US4 and ADV, which skips US5) are built column by column.
+        index = pd.Index(time[first:last], name=self.columns[0], copy=False)
+        step = indices[1] - indices[0] if len(indices) > 1 else 1
+        if len(indices) > 0 and step > 0 and indices == list(range(indices[0], indices[-1] + 1, step)):
+            return pd.DataFrame(table[first:last, indices[0]:indices[-1] + 1:step], index=index, columns=self.selection, copy=False)
+        return pd.DataFrame({column: table[first:last, j] for column, j in zip(self.selection, indices)}, index=index, copy=False)
+
+    def _write_cache(self):
+        # The time column is always stored as float64 in its own file: with a float32 cache the
+        # time steps of long high-rate records would no longer be exactly uniform.
+        table = np.empty((len(self.data), len(self.columns) - 1), dtype=self.cache_dtype, order="F")
+        table[:] = self.data.to_numpy()
+        try:
+            for fname, array in [(self.cache_fname, table), (self.cache_time_fname, self.data.index.to_numpy(dtype="float64"))]:
+                tmp_fname = f"{fname}.tmp"
+                with open(tmp_fname, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmp_fname, fname)
+            self._write_key(self._cache_key(self._file_hash()))
+            return True
+        except OSError as e:
+            print(f"Warning: could not write cache for {self.fname} ({e})")
+            return False
+
+    def _write_key(self, key):
+        with open(self.cache_key_fname, "w") as f:
+            json.dump(key, f)
+
+    def clear_cache(self):
+        for fname in [self.cache_fname, self.cache_time_fname, self.cache_key_fname]:
+            if os.path.exists(fname):
+                os.remove(fname)
+
+    def iter_chunks(self, chunk_rows=100000, columns=None, duration=None):
+        """
+        Yield (time, values) blocks of at most chunk_rows rows without loading the whole file.
+
+        Parameters:
+        chunk_rows (int): Number of rows per block.
+        columns (list): Channels to read, e.g. ["US1", "ADV"]. Defaults to all channels.
+        duration (float): Stop reading at the first sample with time >= duration.
+
+        Yields:
+        tuple: (time, values) where values has shape (rows, len(columns)).
+        """
+        if columns is None:
+            columns = self.columns[1:]
+        elif isinstance(columns, str):
+            columns = [columns]
+        if self.data is not None:
+            source = self._iter_frame(self.data, chunk_rows, columns)
+        elif self.use_cache and self._cache_valid():
+            table = np.load(self.cache_fname, mmap_mode="r")
+            time = np.load(self.cache_time_fname, mmap_mode="r")
+            indices = [self.columns.index(column) - 1 for column in columns]
+            source = ((time[i:i + chunk_rows], table[i:i + chunk_rows][:, indices]) for i in range(0, len(table), chunk_rows))
+        else:
+            usecols = [0] + [self.columns.index(column) for column in columns]
+            reader = pd.read_csv(self.fname, sep=r"\s+", skiprows=1, header=None, usecols=usecols, chunksize=chunk_rows)
+            source = ((chunk[0].to_numpy(), chunk[usecols[1:]].to_numpy()) for chunk in reader)
+        for time, values in source:
+            if duration is not None and len(time) > 0 and time[-1] >= duration:
+                end = np.searchsorted(time, duration, side="left")
+                if end > 0:
+                    yield time[:end], values[:end]
+                return
+            yield time, values
+
+    @staticmethod
+    def _iter_frame(data, chunk_rows, columns):
+        time = data.index.to_numpy()
+        values = data[columns]
+        for i in range(0, len(time), chunk_rows):
+            yield time[i:i + chunk_rows], values.iloc[i:i + chunk_rows].to_numpy()
+
+    @property
+    def time(self):
+        if self.data is None:
+            return None
+        return self.data.index.to_numpy()
+
+    def get_column(self, item):
+        if self.data is None:
+            return None
+        return self.data[item].to_numpy()
+
     def get_frequency(self):
         if self.data is None:
             return None
@@ -30,4 +226,4 @@ class IO:
         except KeyError:
             print(f"Error: {item} not found in the data! Only time is returned!")
             return time
-        
\ No newline at end of file
+
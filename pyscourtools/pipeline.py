@@ -0,0 +1,138 @@
+"""
+Declarative processing pipelines: a list of (method, parameters) stages applied to an Instrument, with every
+intermediate state memoized on disk.
+
+Each stage is keyed by a hash chained from the input data, the tables the methods read (thresholds, scour
+corrections, reach time, removed points) and the name and parameters of every stage up to it. Re-running a
+pipeline loads the last stage whose key is already on disk and only recomputes the stages after it.
+
+Every run starts from the state the instrument entered its first pipeline with (until reset_data or a
+rollback past it), so a re-run with changed stages replaces the previous run instead of processing its output.
+"""
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+from .timebase import UniformTime
+
+
+def _normalize(stages):
+    normalized = []
+    for stage in stages:
+        name, params = (stage, {}) if isinstance(stage, str) else stage
+        normalized.append((name, dict(params)))
+    return normalized
+
+
+def _hash_table(sha, table):
+    if table is not None:
+        sha.update(pd.util.hash_pandas_object(table, index=True).to_numpy().tobytes())
+    sha.update(b"|")
+
+
+def input_key(inst):
+    """
+    Hash of the state an Instrument enters a pipeline with.
+    """
+    sha = hashlib.sha1()
+    sha.update(f"{inst.name}|{inst.unit}|{inst.reach_time}|".encode())
+    if isinstance(inst.time, UniformTime):
+        sha.update(repr(inst.time).encode())
+    else:
+        sha.update(np.ascontiguousarray(inst.time, dtype=float).tobytes())
+    sha.update(np.ascontiguousarray(inst.data, dtype=float).tobytes())
+    for table in (inst.thresholds, inst.correction, inst.corner):
+        _hash_table(sha, table)
+    for points in (f"{inst.name}-points.npy", f"{inst.name}.csv"):
+        if os.path.exists(points):
+            stat = os.stat(points)
+            sha.update(f"{points}|{stat.st_size}|{stat.st_mtime}".encode())
+    return sha.hexdigest()
+
+
+def stage_key(previous, name, params):
+    return hashlib.sha1(f"{previous}|{name}|{json.dumps(params, sort_keys=True, default=repr)}".encode()).hexdigest()
+
+
+def _fname(cache_dir, inst, key):
+    return os.path.join(cache_dir, f"{inst.name}-{key[:20]}.npz")
+
+
+def _save_state(fname, inst):
+    if isinstance(inst.time, UniformTime):
+        time = {"uniform": np.array([inst.time.t0, inst.time.dt, inst.time.n])}
+    else:
+        time = {"time": np.asarray(inst.time, dtype=float)}
+    duration = inst.__dict__.get("duration")
+    # Written under a temporary name first so an interrupted run never leaves a truncated stage behind
+    tmp = fname[:-4] + ".tmp.npz"
+    np.savez(tmp, data=inst.data, unit=np.array(inst.unit), duration=np.array(np.nan if duration is None else duration, dtype=float), **time)
+    os.replace(tmp, fname)
+
+
+def _load_state(fname, inst):
+    with np.load(fname) as stored:
+        inst.data = inst._read_only(stored["data"])
+        if "uniform" in stored:
+            t0, dt, n = stored["uniform"]
+            inst.time = UniformTime(t0, dt, int(n))
+        else:
+            inst.time = inst._read_only(stored["time"])
+        inst.unit = str(stored["unit"])
+        if not np.isnan(stored["duration"]):
+            inst.duration = float(stored["duration"])
+
+
+def _start(inst):
+    # Restore the recorded pipeline input and drop the steps applied since, or record the current state
+    start = inst._pipeline_input
+    if start is None or len(inst.history) < start[1]:
+        inst._pipeline_input = (inst._snapshot(), len(inst.history))
+    else:
+        inst._restore(start[0])
+        del inst.history[start[1]:]
+    return inst._pipeline_input[0]
+
+
+def run_pipeline(inst, stages, cache_dir=None):
+    """
+    Apply stages of Instrument methods to inst, reusing memoized stages from cache_dir. The stages are applied
+    to the pipeline input of inst (see above), not on top of a previous run.
+
+    Parameters:
+    inst (Instrument): Instrument to process in place.
+    stages (list): (method name, parameters dict) tuples, or bare method names.
+    cache_dir (str): Folder of the memoized stages. None disables memoization.
+
+    Returns:
+    list: "cached" or "computed" for every stage.
+    """
+    stages = _normalize(stages)
+    for name, _ in stages:
+        if name.startswith("_") or not callable(getattr(inst, name, None)):
+            raise ValueError(f"'{name}' is not a processing method of Instrument.")
+    state = _start(inst)
+    if cache_dir is None:
+        for name, params in stages:
+            getattr(inst, name)(**params)
+        return ["computed"] * len(stages)
+    os.makedirs(cache_dir, exist_ok=True)
+    keys = []
+    key = input_key(inst)
+    for name, params in stages:
+        key = stage_key(key, name, params)
+        keys.append(key)
+    # Resume after the last stage already on disk
+    done = len(keys)
+    while done > 0 and not os.path.exists(_fname(cache_dir, inst, keys[done - 1])):
+        done -= 1
+    if done > 0:
+        _load_state(_fname(cache_dir, inst, keys[done - 1]), inst)
+        # The loaded stages go into the history without snapshots; rollback recomputes them from the input
+        inst.history.extend({"step": name, "params": dict(params), "state": dict(state, data=state["data"] if i == 0 else None)}
+                            for i, (name, params) in enumerate(stages[:done]))
+    for (name, params), key in zip(stages[done:], keys[done:]):
+        getattr(inst, name)(**params)
+        _save_state(_fname(cache_dir, inst, key), inst)
+    return ["cached"] * done + ["computed"] * (len(stages) - done)
@@ -0,0 +1,133 @@
+"""
+NaN-aware trailing rolling-window kernels for 1D records and 2D (n_samples, n_channels) blocks.
+
+Windows end at the current sample, as in pandas' rolling(). NaNs are ignored inside a window and a
+result is only produced where the window holds at least min_periods valid samples. Windows are given in
+samples, or in seconds when fs (the sampling frequency) is passed.
+"""
+import numpy as np
+import warnings
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import minimum_filter1d, maximum_filter1d
+
+
+def window_samples(window, fs=None):
+    if fs is None:
+        return int(window)
+    return max(int(round(window * fs)), 1)
+
+
+def _prepare(data, window, fs):
+    data = np.asarray(data, dtype=float)
+    window = window_samples(window, fs)
+    if window < 1:
+        raise ValueError("window must be at least one sample")
+    return data, window
+
+
+def _windowed_sum(values, window):
+    # Sum over (i - window, i] = cumsum[i] - cumsum[i - window]
+    cumulative = np.cumsum(values, axis=0)
+    result = cumulative.copy(order="K")
+    result[window:] -= cumulative[:-window]
+    return result
+
+
+def _centered(data, valid):
+    # Remove a per-channel offset before the cumulative sums to limit round-off on long records
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        offset = np.nan_to_num(np.nanmean(data[:1024], axis=0))
+    centered = data - offset
+    centered[~valid] = 0
+    return centered, offset
+
+
+def rolling_count(data, window, fs=None):
+    data, window = _prepare(data, window, fs)
+    return _windowed_sum((~np.isnan(data)).astype(float), window)
+
+
+def rolling_mean(data, window, min_periods=1, fs=None):
+    data, window = _prepare(data, window, fs)
+    valid = ~np.isnan(data)
+    centered, offset = _centered(data, valid)
+    count = _windowed_sum(valid.astype(float), window)
+    total = _windowed_sum(centered, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count + offset
+    mean[count < max(min_periods, 1)] = np.nan
+    return mean
+
+
+def rolling_std(data, window, min_periods=1, ddof=1, fs=None):
+    data, window = _prepare(data, window, fs)
+    valid = ~np.isnan(data)
+    centered, offset = _centered(data, valid)
+    count = _windowed_sum(valid.astype(float), window)
+    total = _windowed_sum(centered, window)
+    squares = _windowed_sum(centered ** 2, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (squares - total ** 2 / count) / (count - ddof)
+    std = np.sqrt(np.maximum(variance, 0))
+    std[(count < max(min_periods, 1)) | (count <= ddof)] = np.nan
+    return std
+
+
+def _extreme(data, window, min_periods, fs, filter1d, fill):
+    data, window = _prepare(data, window, fs)
+    count = _windowed_sum((~np.isnan(data)).astype(float), window)
+    # A trailing window [i - window + 1, i] is a centred filter shifted by origin (window - 1) // 2
+    result = filter1d(np.where(np.isnan(data), fill, data), size=window, axis=0, mode="constant", cval=fill, origin=(window - 1) // 2)
+    result[count < max(min_periods, 1)] = np.nan
+    return result
+
+
+def rolling_min(data, window, min_periods=1, fs=None):
+    return _extreme(data, window, min_periods, fs, minimum_filter1d, np.inf)
+
+
+def rolling_max(data, window, min_periods=1, fs=None):
+    return _extreme(data, window, min_periods, fs, maximum_filter1d, -np.inf)
+
+
+def rolling_median(data, window, min_periods=1, fs=None, chunk_rows=16384):
+    data, window = _prepare(data, window, fs)
+    if data.ndim == 2:
+        return np.column_stack([rolling_median(data[:, j], window, min_periods=min_periods, chunk_rows=chunk_rows) for j in range(data.shape[1])]).reshape(data.shape)
+    count = _windowed_sum((~np.isnan(data)).astype(int), window)
+    padded = np.concatenate((np.full(window - 1, np.nan), data))
+    views = sliding_window_view(padded, window)
+    result = np.full(len(data), np.nan)
+    # Sorting puts the NaNs of each window last, so the median of the c valid samples sits at
+    # positions (c - 1) // 2 and c // 2. Windows are sorted in row chunks to bound memory.
+    for start in range(0, len(data), chunk_rows):
+        ordered = np.sort(views[start:start + chunk_rows], axis=-1)
+        c = count[start:start + chunk_rows]
+        low = np.take_along_axis(ordered, np.maximum((c - 1) // 2, 0)[:, None], axis=-1)[:, 0]
+        high = np.take_along_axis(ordered, (c // 2)[:, None].clip(max=window - 1), axis=-1)[:, 0]
+        result[start:start + chunk_rows] = (low + high) / 2
+    result[count < max(min_periods, 1)] = np.nan
+    return result
+
+
+kernels = {"mean": rolling_mean, "std": rolling_std, "median": rolling_median, "min": rolling_min, "max": rolling_max}
+
+
+def rolling(data, window, kind="mean", min_periods=1, fs=None):
+    """
+    Trailing rolling statistic of a 1D record or along axis 0 of a 2D block.
+
+    Parameters:
+    data (np.array): Input data.
+    window (int or float): Window length in samples, or in seconds if fs is given.
+    kind (str): "mean", "std", "median", "min" or "max".
+    min_periods (int): Minimum number of valid samples in a window required to have a value.
+    fs (float): Sampling frequency in Hz for windows given in seconds.
+
+    Returns:
+    np.array: Rolling statistic with the shape of data.
+    """
+    if kind not in kernels:
+        raise ValueError(f"Invalid rolling statistic '{kind}'. Choose from {', '.join(kernels)}.")
+    return kernels[kind](data, window, min_periods=min_periods, fs=fs)
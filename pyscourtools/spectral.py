@@ -0,0 +1,173 @@
+"""
+Batched spectral analysis (Welch PSD, spectrogram, band energy) of all channels of one or many experiments.
+
+Channels are stacked into (n_samples, n_channels) blocks and every segment of every channel is transformed by
+one real FFT. Segment layouts and windows are built once per (length, sampling rate, segment parameters), and
+results are cached by a hash of the data so repeated calls in a notebook are free.
+"""
+import numpy as np
+import pandas as pd
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft, signal
+from scipy.integrate import trapezoid
+from .gaps import fill_gaps
+
+_results = OrderedDict()
+cache_size = 64
+
+
+@lru_cache(maxsize=32)
+def _layout(n, fs, nperseg, noverlap, window):
+    # Window, segment step, PSD scaling and frequencies for a record length and sampling rate
+    nperseg = min(nperseg, n)
+    noverlap = nperseg // 2 if noverlap is None else min(noverlap, nperseg - 1)
+    win = signal.get_window(window, nperseg)
+    win.flags.writeable = False
+    step = nperseg - noverlap
+    scale = 1 / (fs * (win ** 2).sum())
+    freqs = fft.rfftfreq(nperseg, 1 / fs)
+    freqs.flags.writeable = False
+    return win, step, scale, freqs
+
+
+def _cached(kind, data, fs, params, compute):
+    sha = hashlib.sha1(np.ascontiguousarray(data).tobytes())
+    sha.update(repr((kind, data.shape, float(fs), params)).encode())
+    key = sha.hexdigest()
+    if key in _results:
+        _results.move_to_end(key)
+        return _results[key]
+    result = compute()
+    for array in result:
+        array.flags.writeable = False
+    _results[key] = result
+    while len(_results) > cache_size:
+        _results.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    _results.clear()
+
+
+def _segments(data, fs, nperseg, noverlap, window):
+    data = np.asarray(data, dtype=float)
+    if np.isnan(data).any():
+        data = fill_gaps(data)
+    win, step, scale, freqs = _layout(len(data), float(fs), nperseg, noverlap, window)
+    # (n_segments, n_channels, nperseg) strided view; nothing is copied before the detrend
+    segments = sliding_window_view(data, len(win), axis=0)[::step]
+    segments = (segments - segments.mean(axis=-1, keepdims=True)) * win
+    spectrum = fft.rfft(segments, axis=-1, workers=-1)
+    power = (spectrum.real ** 2 + spectrum.imag ** 2) * scale
+    # One-sided spectrum: every bin but DC (and Nyquist for even segments) carries both signs
+    power[..., 1:len(freqs) - (1 if len(win) % 2 == 0 else 0)] *= 2
+    return freqs, step, len(win), power
+
+
+def welch(data, fs, nperseg=256, noverlap=None, window="hann"):
+    """
+    Welch power spectral density of every channel (as scipy.signal.welch with constant detrending).
+
+    Parameters:
+    data (np.array): 1D record or 2D (n_samples, n_channels) block.
+    fs (float): Sampling frequency in Hz.
+    nperseg (int): Segment length in samples.
+    noverlap (int): Overlap between segments in samples. Defaults to nperseg // 2.
+    window (str): Window name (scipy.signal.get_window).
+
+    Returns:
+    tuple: (frequencies, PSD of shape (n_frequencies,) or (n_frequencies, n_channels)).
+    """
+    data = np.asarray(data, dtype=float)
+    block = data[:, None] if data.ndim == 1 else data
+
+    def compute():
+        freqs, _, _, power = _segments(block, fs, nperseg, noverlap, window)
+        return freqs.copy(), power.mean(axis=0).T
+
+    freqs, psd = _cached("welch", block, fs, (nperseg, noverlap, window), compute)
+    return freqs, psd[:, 0] if data.ndim == 1 else psd
+
+
+def spectrogram(data, fs, nperseg=256, noverlap=None, window="hann"):
+    """
+    Spectrogram (PSD of every segment) of every channel.
+
+    Returns:
+    tuple: (frequencies, segment centre times, power of shape (n_frequencies, n_segments) or
+        (n_frequencies, n_segments, n_channels)).
+    """
+    data = np.asarray(data, dtype=float)
+    block = data[:, None] if data.ndim == 1 else data
+
+    def compute():
+        freqs, step, length, power = _segments(block, fs, nperseg, noverlap, window)
+        times = (np.arange(power.shape[0]) * step + length / 2) / fs
+        return freqs.copy(), times, power.transpose(2, 0, 1)
+
+    freqs, times, power = _cached("spectrogram", block, fs, (nperseg, noverlap, window), compute)
+    return freqs, times, power[:, :, 0] if data.ndim == 1 else power
+
+
+def band_energy(data, fs, bands, nperseg=256, noverlap=None, window="hann"):
+    """
+    Energy (integrated PSD) of every channel in frequency bands.
+
+    Parameters:
+    bands (list): (f_low, f_high) tuples in Hz.
+
+    Returns:
+    np.array: Energy of shape (n_bands,) or (n_bands, n_channels).
+    """
+    freqs, psd = welch(data, fs, nperseg=nperseg, noverlap=noverlap, window=window)
+    energy = []
+    for low, high in bands:
+        inside = (freqs >= low) & (freqs <= high)
+        energy.append(trapezoid(psd[inside], freqs[inside], axis=0) if inside.sum() > 1 else np.zeros(psd.shape[1:]))
+    return np.array(energy)
+
+
+def _stack(instruments):
+    # Channels with the same length and sampling rate share one block (and one batched FFT)
+    groups = {}
+    for inst in instruments:
+        groups.setdefault((len(inst.data), round(inst.get_frequency(), 6)), []).append(inst)
+    for (_, fs), insts in groups.items():
+        yield fs, insts, np.column_stack([inst.data for inst in insts])
+
+
+def _labels(insts):
+    return pd.MultiIndex.from_tuples([(inst.test_name, inst.name) for inst in insts], names=["Test", "Instrument"])
+
+
+def psd_table(instruments, nperseg=256, noverlap=None, window="hann"):
+    """
+    Welch PSD of many instruments (from one or several experiments).
+
+    Returns:
+    pd.DataFrame: PSD indexed by frequency, with (test, instrument) columns.
+    """
+    frames = []
+    for fs, insts, block in _stack(instruments):
+        freqs, psd = welch(block, fs, nperseg=nperseg, noverlap=noverlap, window=window)
+        frames.append(pd.DataFrame(psd, index=pd.Index(freqs, name="Frequency [Hz]"), columns=_labels(insts)))
+    return pd.concat(frames, axis=1)
+
+
+def band_table(instruments, bands, nperseg=256, noverlap=None, window="hann"):
+    """
+    Band energies of many instruments (from one or several experiments).
+
+    Returns:
+    pd.DataFrame: One row per (test, instrument) and one column per band.
+    """
+    columns = [f"{low}-{high} Hz" for low, high in bands]
+    frames = []
+    for fs, insts, block in _stack(instruments):
+        energy = band_energy(block, fs, bands, nperseg=nperseg, noverlap=noverlap, window=window)
+        frames.append(pd.DataFrame(energy.T, index=_labels(insts), columns=columns))
+    return pd.concat(frames)
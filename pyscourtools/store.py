@@ -0,0 +1,103 @@
+import numpy as np
+import zipfile
+import json
+import io
+import os
+from .timebase import UniformTime
+
+
+class ProcessedStore:
+    """
+    Single-file store of the processed channels of one experiment ("Processed Data/processed.npz").
+
+    The file is a zip archive with, for every channel, "{key}.data.npy", an optional "{key}.time.npy" (uniform time
+    axes are stored as t0, dt, n in the metadata instead) and "{key}.json" with the unit and processing metadata.
+    New channels are appended to the archive; replacing a channel rewrites it. Loading reads the file once.
+    """
+    def __init__(self, fname="Processed Data/processed.npz") -> None:
+        self.fname = fname
+
+    def exists(self):
+        return os.path.exists(self.fname)
+
+    def keys(self):
+        if not self.exists():
+            return []
+        with zipfile.ZipFile(self.fname) as archive:
+            return [name[:-5] for name in archive.namelist() if name.endswith(".json")]
+
+    @staticmethod
+    def _array_bytes(array):
+        buffer = io.BytesIO()
+        np.lib.format.write_array(buffer, np.ascontiguousarray(array), allow_pickle=False)
+        return buffer.getvalue()
+
+    @classmethod
+    def _members(cls, key, time, data, metadata):
+        metadata = dict(metadata)
+        members = {f"{key}.data.npy": cls._array_bytes(np.asarray(data, dtype=float))}
+        if isinstance(time, UniformTime):
+            metadata["time"] = {"t0": time.t0, "dt": time.dt, "n": time.n}
+        else:
+            metadata["time"] = None
+            members[f"{key}.time.npy"] = cls._array_bytes(np.asarray(time, dtype=float))
+        members[f"{key}.json"] = json.dumps(metadata, default=repr).encode()
+        return members
+
+    def write(self, channels):
+        """
+        Add channels to the store, replacing channels with the same key.
+
+        Parameters:
+        channels (dict): key -> (time, data, metadata dict). The metadata should hold at least "unit".
+        """
+        members = {}
+        for key, (time, data, metadata) in channels.items():
+            members.update(self._members(key, time, data, metadata))
+        folder = os.path.dirname(self.fname)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if not set(channels).intersection(self.keys()):
+            # Zip archives can be appended to without touching the channels already stored
+            with zipfile.ZipFile(self.fname, "a") as archive:
+                for name, content in members.items():
+                    archive.writestr(name, content)
+            return
+        # A replaced channel cannot be removed from a zip in place: rewrite the archive without it
+        with zipfile.ZipFile(self.fname) as archive:
+            kept = {name: archive.read(name) for name in archive.namelist() if name.rsplit(".", 2)[0] not in channels}
+        kept.update(members)
+        tmp = self.fname + ".tmp"
+        with zipfile.ZipFile(tmp, "w") as archive:
+            for name, content in kept.items():
+                archive.writestr(name, content)
+        os.replace(tmp, self.fname)
+
+    def load(self, keys=None):
+        """
+        Read channels from the store in one pass over the file.
+
+        Parameters:
+        keys (list): Channels to return. Defaults to all channels.
+
+        Returns:
+        dict: key -> (time, data, metadata), with time a UniformTime for uniformly sampled channels.
+        """
+        with open(self.fname, "rb") as f:
+            content = io.BytesIO(f.read())
+        channels = {}
+        with zipfile.ZipFile(content) as archive:
+            for name in archive.namelist():
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-5]
+                if keys is not None and key not in keys:
+                    continue
+                metadata = json.loads(archive.read(name))
+                data = np.lib.format.read_array(io.BytesIO(archive.read(f"{key}.data.npy")))
+                if metadata.get("time") is not None:
+                    time = UniformTime(metadata["time"]["t0"], metadata["time"]["dt"], metadata["time"]["n"])
+                else:
+                    time = np.lib.format.read_array(io.BytesIO(archive.read(f"{key}.time.npy")))
+                channels[key] = (time, data, metadata)
+        return channels
@@ -0,0 +1,130 @@
+"""
+Summary metrics (arrival, peak, time to peak, time integral, final bed elevation) of every instrument of one or many
+experiments, as one tidy table indexed by (test, instrument).
+
+Instruments on the same clock, from any test, are stacked into (n_samples, n_channels) blocks and every
+metric is computed for all channels of a block with column-wise array operations.
+"""
+import numpy as np
+import pandas as pd
+import warnings
+from scipy.integrate import trapezoid
+from .alignment import group_by_clock
+from .arrival import detect_arrival
+from .gaps import fill_gaps
+from .timebase import UniformTime
+from .instrument import Instrument
+from .utils import utils, Impoundment, Angle
+
+# Samples per block (n_samples x n_channels). Short records are processed many channels per block; a record
+# longer than block_size is processed one channel at a time, which was the fastest layout for long records
+# (wider blocks of long records have temporaries that no longer fit in cache).
+block_size = 2 ** 16
+
+
+def _block_metrics(t, dt, block, arrival, velocity):
+    # Metrics of every column of one block, from the arrival on (whole record where arrival is NaN);
+    # dt is None for a non-uniform time axis
+    n = len(t)
+    columns = np.arange(block.shape[1])
+    start = np.where(np.isnan(arrival), 0, np.searchsorted(t, np.nan_to_num(arrival)))
+    invalid = np.isnan(block)
+    use = np.arange(n)[:, None] >= start
+    use &= ~invalid
+    magnitude = np.abs(block, where=velocity, out=block.copy(order="F"))
+    np.copyto(magnitude, -np.inf, where=~use)
+    k = np.argmax(magnitude, axis=0)
+    empty = ~use[k, columns]
+    peak = np.where(empty, np.nan, block[k, columns])
+    peak_time = np.where(empty, np.nan, t[k])
+    # Gaps are bridged by linear interpolation for the integral
+    values = fill_gaps(block) if invalid.any() else block.copy(order="F")
+    values[np.arange(n)[:, None] < start] = 0
+    values = np.nan_to_num(values, copy=False)
+    first = np.minimum(start, n - 1)
+    if dt is not None:
+        # Trapezoid on a uniform axis from the start sample: dt * (sum - (first + last) / 2)
+        integral = dt * (values.sum(axis=0) - (values[first, columns] + values[n - 1]) / 2)
+    else:
+        integral = trapezoid(values, t, axis=0)
+        # Remove the half step the zeroed samples add before the arrival sample
+        integral -= np.where(start > 0, 0.5 * values[first, columns] * (t[first] - t[np.maximum(first - 1, 0)]), 0)
+    integral = np.where(empty, np.nan, integral)
+    return peak, peak_time, integral
+
+
+def _test_info(inst):
+    info = utils.parse_test_name(inst.test_name)
+    if info is None:
+        return {"Structure": None, "Impoundment": None, "Angle": None, "Repeated": None,
+                "Impoundment [m]": np.nan, "Angle [deg]": np.nan}
+    return {"Structure": info["structure"], "Impoundment": info["impoundment"], "Angle": info["angle"],
+            "Repeated": info["repeated"], "Impoundment [m]": Impoundment(inst).height, "Angle [deg]": Angle(inst).angle}
+
+
+def _final_bed(inst):
+    # final_scour is the LiDAR bed elevation at the instrument (ScourScatter.get_scour_depth), negative and in cm;
+    # both values are returned as bed elevations in the instrument unit
+    bed = inst.bed_elevation()
+    final = float(bed[-1]) if bed is not None and len(bed) > 0 else np.nan
+    measured = getattr(inst, "final_scour", None)
+    if measured is None or (inst.unit != "cm" and inst.unit not in Instrument.conversion_factors["cm"]):
+        return final, np.nan
+    return final, float(measured) * Instrument.conversion_factors["cm"].get(inst.unit, 1)
+
+
+def summarize(instruments, detect=True, **kwargs):
+    """
+    Summary metrics of many instruments (from one or several experiments).
+
+    Arrival times are the instruments' reach_time; where it is not set they are detected (see
+    arrival.detect_arrival) when detect is True, without changing reach_time. Peaks are the largest value
+    (largest magnitude for velocities) and time integrals are taken from the arrival to the end of the record.
+    The final bed elevation (the last value of the scour depth correction table, as a negative elevation) is
+    compared with the LiDAR bed elevation in final_scour; both are given in the instrument unit ("Unit" column).
+
+    Parameters:
+    instruments (list): Instruments to summarize.
+    detect (bool): Detect missing arrival times.
+    **kwargs: Detection parameters passed to arrival.detect_arrival.
+
+    Returns:
+    pd.DataFrame: One row per (test, instrument) with test info (structure, impoundment, angle), variable,
+        unit, arrival, peak, peak time, time to peak, time integral and final bed elevation columns.
+    """
+    instruments = list(instruments)
+    metrics = [None] * len(instruments)
+    for group in group_by_clock(instruments):
+        # The time axis is materialized once per clock
+        time = instruments[group[0]].time
+        t = np.asarray(time, dtype=float)
+        dt = time.dt if isinstance(time, UniformTime) else None
+        width = max(block_size // max(len(t), 1), 1)
+        for start in range(0, len(group), width):
+            part = group[start:start + width]
+            insts = [instruments[j] for j in part]
+            # Column-major, so the scans along time run over contiguous memory
+            block = np.empty((len(t), len(insts)), order="F")
+            for i, inst in enumerate(insts):
+                block[:, i] = inst.data
+            arrival = np.array([np.nan if inst.reach_time is None else inst.reach_time for inst in insts], dtype=float)
+            missing = np.isnan(arrival)
+            if detect and missing.any() and len(t) > 1:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    arrival[missing] = detect_arrival(t, block if missing.all() else np.asfortranarray(block[:, missing]), **kwargs)
+            velocity = np.array([getattr(inst, "variable", None) == "Velocity" for inst in insts])
+            peak, peak_time, integral = _block_metrics(t, dt, block, arrival, velocity)
+            for i, j in enumerate(part):
+                metrics[j] = (arrival[i], peak[i], peak_time[i], integral[i])
+    rows = []
+    for inst, (arrival, peak, peak_time, integral) in zip(instruments, metrics):
+        final, measured = _final_bed(inst)
+        row = _test_info(inst)
+        row.update({"Variable": getattr(inst, "variable", None), "Unit": inst.unit, "Arrival [s]": arrival,
+                    "Peak": peak, "Peak Time [s]": peak_time, "Time to Peak [s]": peak_time - arrival,
+                    "Time Integral": integral, "Final Bed Elevation": final, "Measured Final Bed Elevation": measured,
+                    "Bed Elevation Error": final - measured})
+        rows.append(row)
+    index = pd.MultiIndex.from_arrays([[inst.test_name for inst in instruments], [inst.name for inst in instruments]], names=["Test", "Instrument"])
+    return pd.DataFrame(rows, index=index)
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+import os
+from .timebase import searchsorted, same_axis
+
+class ThresholdRules:
+    """
+    Threshold table ("Instrument", "Type", "Start", "End", "Threshold", "Unit") compiled for vectorized cleaning.
+
+    For a given time axis and instrument unit the rules are compiled once into two envelopes: the lowest
+    "greater than" threshold and the highest "less than" threshold in force at every sample, with every
+    threshold converted to the instrument unit and every time window resolved with searchsorted. Cleaning
+    is then a single comparison pass over the data, whatever the number of rules.
+    """
+    _cache = {}
+
+    def __init__(self, table) -> None:
+        self.table = table
+        self._key = self._content_key(table)
+        self._subsets = {}
+        self._compiled = {}
+        types = table["Type"].str.lower().to_numpy() if len(table) > 0 else np.array([], dtype=str)
+        self.greater = types == "g"
+        self.less = types == "l"
+        self.start = table["Start"].to_numpy(dtype=float) if len(table) > 0 else np.array([])
+        self.end = table["End"].to_numpy(dtype=float) if len(table) > 0 else np.array([])
+        self.threshold = table["Threshold"].to_numpy(dtype=float) if len(table) > 0 else np.array([])
+        self.units = table["Unit"].to_numpy() if len(table) > 0 else np.array([])
+
+    @classmethod
+    def from_csv(cls, fname):
+        """
+        Read a thresholds CSV; the file is only parsed once while it is unchanged. Every caller gets its
+        own copy of the table, so editing the thresholds of one experiment does not affect the others.
+        """
+        stat = os.stat(fname)
+        key = (os.path.abspath(fname), stat.st_size, stat.st_mtime)
+        if key not in cls._cache:
+            cls._cache[key] = pd.read_csv(fname)
+        return cls(cls._cache[key].copy())
+
+    @staticmethod
+    def _content_key(table):
+        return tuple(table.columns), pd.util.hash_pandas_object(table, index=True).to_numpy()
+
+    def matches(self, table):
+        """
+        Whether the rules were compiled from a table with the same content, so edits made in place are detected.
+        """
+        columns, hashes = self._content_key(table)
+        return columns == self._key[0] and np.array_equal(hashes, self._key[1])
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getstate__(self):
+        # Compiled envelopes are as long as the record; rebuild them after unpickling instead of copying them
+        state = self.__dict__.copy()
+        state["_compiled"] = {}
+        return state
+
+    def for_instrument(self, name):
+        if name not in self._subsets:
+            self._subsets[name] = ThresholdRules(self.table[self.table["Instrument"] == name])
+        return self._subsets[name]
+
+    def _converted_thresholds(self, unit):
+        from .instrument import Instrument
+        factors = np.ones(len(self.threshold))
+        for i, rule_unit in enumerate(self.units):
+            if rule_unit != unit:
+                if unit not in Instrument.conversion_factors or rule_unit not in Instrument.conversion_factors[unit]:
+                    raise ValueError(f"Conversion from {unit} to {rule_unit} is not supported.")
+                factors[i] = Instrument.conversion_factors[unit][rule_unit]
+        # data * factor > threshold  <=>  data > threshold / factor (all factors are positive)
+        return self.threshold / factors
+
+    def compile(self, time, unit):
+        """
+        Return the (upper, lower) envelopes for a time axis and instrument unit; either may be None if no rule uses it.
+        """
+        cached = self._compiled.get(unit)
+        if cached is not None and same_axis(cached[0], time):
+            return cached[1], cached[2]
+        thresholds = self._converted_thresholds(unit)
+        # Windows are open intervals: start < t < end
+        first = searchsorted(time, self.start, side="right")
+        last = searchsorted(time, self.end, side="left")
+        upper = lower = None
+        if self.greater.any():
+            upper = np.full(len(time), np.inf)
+            for i in np.flatnonzero(self.greater):
+                np.minimum(upper[first[i]:last[i]], thresholds[i], out=upper[first[i]:last[i]])
+        if self.less.any():
+            lower = np.full(len(time), -np.inf)
+            for i in np.flatnonzero(self.less):
+                np.maximum(lower[first[i]:last[i]], thresholds[i], out=lower[first[i]:last[i]])
+        self._compiled[unit] = (time, upper, lower)
+        return upper, lower
+
+    def mask(self, time, data, unit):
+        """
+        Boolean mask of the samples of data (in unit) that violate any rule.
+        """
+        if len(self) == 0:
+            return np.zeros(len(data), dtype=bool)
+        upper, lower = self.compile(time, unit)
+        mask = np.zeros(len(data), dtype=bool)
+        if upper is not None:
+            mask |= data > upper
+        if lower is not None:
+            mask |= data < lower
+        return mask
@@ -0,0 +1,159 @@
+import numpy as np
+
+class UniformTime(np.lib.mixins.NDArrayOperatorsMixin):
+    """
+    Implicit, uniformly sampled time axis t[i] = t0 + i * dt for i in range(n).
+
+    It behaves like a read-only 1D float array (indexing, len, arithmetic, comparisons, min/max/mean and
+    plotting) but only stores (t0, dt, n). Index <-> time conversion and window slicing are O(1); the full
+    array is only materialized when a NumPy function or another ndarray method (astype, tolist, ...) needs it.
+    """
+    dtype = np.dtype(float)
+    ndim = 1
+
+    def __init__(self, t0, dt, n) -> None:
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.n = int(n)
+
+    @classmethod
+    def from_array(cls, time, rtol=1e-3):
+        """
+        Return a UniformTime for uniformly sampled times, or the array itself if the sampling is not uniform.
+
+        Parameters:
+        time (np.array): Time array.
+        rtol (float): Largest allowed deviation from the uniform grid, as a fraction of the time step.
+        """
+        if isinstance(time, UniformTime):
+            return time
+        time = np.asarray(time)
+        if time.ndim != 1 or len(time) < 2:
+            return time
+        dt = (time[-1] - time[0]) / (len(time) - 1)
+        if not np.isfinite(dt) or dt <= 0:
+            return time
+        deviation = np.abs(time - (time[0] + dt * np.arange(len(time)))).max()
+        if deviation > rtol * dt:
+            return time
+        return cls(time[0], dt, len(time))
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+    @property
+    def size(self):
+        return self.n
+
+    def __len__(self):
+        return self.n
+
+    def __array__(self, dtype=None, copy=None):
+        time = self.t0 + self.dt * np.arange(self.n)
+        return time if dtype is None else time.astype(dtype)
+
+    def to_numpy(self):
+        return np.asarray(self)
+
+    def copy(self):
+        return UniformTime(self.t0, self.dt, self.n)
+
+    def __iter__(self):
+        return iter(np.asarray(self))
+
+    def __getattr__(self, name):
+        # Other ndarray attributes and methods (astype, tolist, std, ...) are taken from the materialized array
+        if name.startswith("_") or not hasattr(np.ndarray, name):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return getattr(np.asarray(self), name)
+
+    def _reduce(self, name, value, axis, out, kwargs):
+        # O(1) reductions of the whole axis; anything else goes through the materialized array
+        if self.n > 0 and axis in (None, 0) and out is None and not kwargs:
+            return value
+        return getattr(np.asarray(self), name)(axis=axis, out=out, **kwargs)
+
+    def min(self, axis=None, out=None, **kwargs):
+        return self._reduce("min", min(self.t0, self.t0 + (self.n - 1) * self.dt), axis, out, kwargs)
+
+    def max(self, axis=None, out=None, **kwargs):
+        return self._reduce("max", max(self.t0, self.t0 + (self.n - 1) * self.dt), axis, out, kwargs)
+
+    def mean(self, axis=None, dtype=None, out=None, **kwargs):
+        if dtype is not None:
+            kwargs["dtype"] = dtype
+        return self._reduce("mean", self.t0 + (self.n - 1) / 2 * self.dt, axis, out, kwargs)
+
+    def __repr__(self):
+        return f"UniformTime(t0={self.t0}, dt={self.dt}, n={self.n})"
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += self.n
+            if not 0 <= key < self.n:
+                raise IndexError(f"index {key} is out of bounds for a time axis of length {self.n}")
+            return self.t0 + key * self.dt
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.n)
+            return UniformTime(self.t0 + start * self.dt, self.dt * step, len(range(start, stop, step)))
+        return np.asarray(self)[key]
+
+    def searchsorted(self, value, side="left"):
+        """
+        O(1) equivalent of np.searchsorted on the materialized axis.
+        """
+        position = (np.asarray(value, dtype=float) - self.t0) / self.dt
+        if side == "left":
+            index = np.ceil(position - 1e-9)
+        else:
+            index = np.floor(position + 1e-9) + 1
+        index = np.clip(index, 0, self.n).astype(int)
+        return index if index.ndim else int(index)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # Shifting and scaling by a scalar keep the axis implicit; everything else is evaluated on the
+        # materialized array.
+        if method == "__call__" and len(inputs) == 2 and not kwargs:
+            a, b = inputs
+            if isinstance(a, UniformTime) and np.isscalar(b):
+                if ufunc is np.add:
+                    return UniformTime(a.t0 + b, a.dt, a.n)
+                if ufunc is np.subtract:
+                    return UniformTime(a.t0 - b, a.dt, a.n)
+                if ufunc is np.multiply and b > 0:
+                    return UniformTime(a.t0 * b, a.dt * b, a.n)
+                if ufunc is np.true_divide and b > 0:
+                    return UniformTime(a.t0 / b, a.dt / b, a.n)
+            if isinstance(b, UniformTime) and np.isscalar(a):
+                if ufunc is np.add:
+                    return UniformTime(b.t0 + a, b.dt, b.n)
+                if ufunc is np.multiply and a > 0:
+                    return UniformTime(b.t0 * a, b.dt * a, b.n)
+        inputs = tuple(np.asarray(x) if isinstance(x, UniformTime) else x for x in inputs)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+
+def searchsorted(time, value, side="left"):
+    if isinstance(time, UniformTime):
+        return time.searchsorted(value, side=side)
+    return np.searchsorted(time, value, side=side)
+
+
+def same_axis(a, b):
+    """
+    True if a and b are the same time axis: the same object, or equal implicit axes.
+    """
+    if a is b:
+        return True
+    return isinstance(a, UniformTime) and isinstance(b, UniformTime) and (a.t0, a.dt, a.n) == (b.t0, b.dt, b.n)
+
+
+def window(time, start=None, end=None):
+    """
+    Slice selecting start <= t < end on a sorted time axis (implicit or explicit).
+    """
+    first = 0 if start is None else searchsorted(time, start, side="left")
+    last = len(time) if end is None else searchsorted(time, end, side="left")
+    return slice(first, max(first, last))
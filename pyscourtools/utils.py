@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import os
 
 class Point:
     def __init__(self, x, y) -> None:
@@ -121,6 +122,25 @@ class Angle:
             self.angle = 90
 
 class utils:
+    structures = ["SC", "SW", "LW"]
+    impoundments = ["H1", "H2", "H3"]
+    angles = ["A0", "A1", "A2", "A3"]
+
+    @staticmethod
+    def parse_test_name(test_name):
+        """
+        Split a test name such as "SC-H1-A2" or "LW-H3-A0-R" into its parts.
+
+        Returns:
+        dict: structure, impoundment, angle and repeated, or None if the name does not follow the convention.
+        """
+        parts = os.path.basename(os.path.normpath(str(test_name))).split("-")
+        if len(parts) not in [3, 4] or (len(parts) == 4 and parts[3] != "R"):
+            return None
+        if parts[0] not in utils.structures or parts[1] not in utils.impoundments or parts[2] not in utils.angles:
+            return None
+        return {"structure": parts[0], "impoundment": parts[1], "angle": parts[2], "repeated": len(parts) == 4}
+
     @staticmethod
     def get_experiment_info(experiment):
         structure = Structure(experiment)
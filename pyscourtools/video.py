@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 import matplotlib.pyplot as plt
 import shutil
 import os
@@ -28,6 +29,43 @@ class Video:
         cap.release()
         return fps
     
+    def intensity_series(self, roi=None, start_time=0, end_time=None, step=1):
+        """
+        Mean grey level of every frame (or of a region of interest), e.g. to synchronize the video with the logger.
+
+        Parameters:
+        roi (tuple): (xmin, xmax, ymin, ymax) pixel bounds of the region. Defaults to the whole frame.
+        start_time (float): Start time in seconds.
+        end_time (float): End time in seconds. Defaults to the end of the video.
+        step (int): Use every step-th frame.
+
+        Returns:
+        tuple: (time, intensity) arrays.
+        """
+        cap = cv2.VideoCapture(self.input)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video {self.input}.")
+        frame_rate = cap.get(cv2.CAP_PROP_FPS)
+        start_frame = int(start_time * frame_rate)
+        end_frame = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if end_time is None else int(end_time * frame_rate)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        frames, intensity = [], []
+        for frame_num in range(start_frame, end_frame):
+            # grab() skips decoding the frames that are not used
+            if (frame_num - start_frame) % step:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if roi is not None:
+                frame = frame[roi[2]:roi[3], roi[0]:roi[1]]
+            frames.append(frame_num)
+            intensity.append(frame.mean())
+        cap.release()
+        return np.array(frames) / frame_rate, np.array(intensity)
+
     def _get_frames(self, start_time, end_time):
         # Open the video file
         cap = cv2.VideoCapture(self.input)